@@ -1,5 +1,50 @@
 import argparse
-import pandas as pd
+import os
+
+import duckdb
+
+from duck import configure
+from task_store import store_source, write_task_store
+
+# the only pod-list columns the builder reads; parsed as text and converted
+# with TRY_CAST, so malformed values become NULL (as pd.to_numeric(errors="coerce"))
+USED_COLUMNS = ["creation_time", "scheduled_time", "deletion_time", "cpu_milli", "memory_mib"]
+
+CLEAN_SQL = """
+WITH typed AS (
+  SELECT
+    TRY_CAST(creation_time AS DOUBLE) AS arrival_time_s,
+    TRY_CAST(scheduled_time AS DOUBLE) AS sched_time_s,
+    TRY_CAST(deletion_time AS DOUBLE) AS end_time_s,
+    TRY_CAST(cpu_milli AS DOUBLE) / {cpu_cap} AS cpu_req,
+    TRY_CAST(memory_mib AS DOUBLE) / {mem_cap} AS mem_req
+  FROM {src}
+),
+timed AS (
+  SELECT
+    arrival_time_s,
+    -- Fallback: if scheduled_time is missing/0, treat start as arrival
+    end_time_s - CASE
+      WHEN sched_time_s IS NULL OR sched_time_s <= 0 THEN arrival_time_s
+      ELSE sched_time_s
+    END AS runtime_s,
+    cpu_req,
+    mem_req
+  FROM typed
+)
+SELECT arrival_time_s, runtime_s, cpu_req, mem_req
+FROM timed
+WHERE
+  arrival_time_s IS NOT NULL
+  -- Filters similar to Google
+  AND runtime_s > 0
+  AND runtime_s <= 86400
+  AND cpu_req > 0
+  AND mem_req > 0
+  -- Keep only tasks that fit within one VM under our normalization
+  AND cpu_req <= 1.0
+  AND mem_req <= 1.0
+"""
 
 
 def main():
@@ -10,7 +55,8 @@ def main():
     )
     p.add_argument(
         "--out",
-        default="data/processed/alibaba/alibaba_tasks_clean.parquet",
+        default="data/processed/alibaba/alibaba_tasks_clean",
+        help="partitioned task store directory (see task_store.py)",
     )
     p.add_argument(
         "--cpu_cap_milli",
@@ -24,57 +70,44 @@ def main():
         required=True,
         help="VM memory capacity in MiB for normalization (e.g., 65536)",
     )
+    p.add_argument("--threads", type=int, default=os.cpu_count() or 4)
+    p.add_argument("--memory_limit", default=None, help="e.g. 8GB")
+    p.add_argument("--temp_dir", default=None, help="spill directory for the final sort")
     args = p.parse_args()
 
-    df = pd.read_csv(args.inp)
+    con = duckdb.connect()
+    configure(con, args.threads, args.memory_limit, args.temp_dir)
 
-    # Basic fields
-    df = df.rename(
-        columns={
-            "creation_time": "arrival_time_s",
-            "scheduled_time": "start_time_s",
-            "deletion_time": "end_time_s",
-            "cpu_milli": "cpu_milli",
-            "memory_mib": "mem_mib",
-        }
+    # The CSV is streamed and only USED_COLUMNS are parsed; filtering and
+    # normalization run in the scan, so only the output-sized table of four
+    # doubles is materialized.
+    types = ", ".join(f"'{c}': 'VARCHAR'" for c in USED_COLUMNS)
+    src = f"read_csv('{args.inp}', header=true, types={{{types}}})"
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE tasks AS "
+        + CLEAN_SQL.format(
+            src=src,
+            cpu_cap=float(args.cpu_cap_milli),
+            mem_cap=float(args.mem_cap_mib),
+        )
     )
 
-    # Convert types
-    for c in ["arrival_time_s", "start_time_s", "end_time_s", "cpu_milli", "mem_mib"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    # Fallback: if scheduled_time is missing/0, treat start as arrival
-    df.loc[(df["start_time_s"].isna()) | (df["start_time_s"] <= 0), "start_time_s"] = df[
-        "arrival_time_s"
-    ]
-
-    df["runtime_s"] = df["end_time_s"] - df["start_time_s"]
-
-    # Normalize CPU/mem into [0,1] fractions of a VM
-    df["cpu_req"] = df["cpu_milli"] / float(args.cpu_cap_milli)
-    df["mem_req"] = df["mem_mib"] / float(args.mem_cap_mib)
-
-    # Filters similar to Google
-    df = df[df["runtime_s"] > 0]
-    df = df[df["runtime_s"] <= 86400]  # 1 day cap
-    df = df[df["cpu_req"] > 0]
-    df = df[df["mem_req"] > 0]
-
-    # Keep only tasks that fit within one VM under our normalization
-    df = df[(df["cpu_req"] <= 1.0) & (df["mem_req"] <= 1.0)]
-
     # Shift time so first arrival is at 0 for simulation convenience
-    t0 = float(df["arrival_time_s"].min())
-    df["arrival_time_s"] = df["arrival_time_s"] - t0
-
-    out = df[["arrival_time_s", "runtime_s", "cpu_req", "mem_req"]].dropna()
-    out = out.sort_values("arrival_time_s").reset_index(drop=True)
+    t0 = con.execute("SELECT MIN(arrival_time_s) FROM tasks").fetchone()[0]
+    n = write_task_store(
+        con,
+        f"SELECT arrival_time_s - {float(t0)} AS arrival_time_s, runtime_s, cpu_req, mem_req FROM tasks",
+        args.out,
+    )
 
-    out.to_parquet(args.out, index=False)
+    tmin, tmax, cpu_mean, mem_mean = con.execute(f"""
+    SELECT MIN(arrival_time_s), MAX(arrival_time_s), AVG(cpu_req), AVG(mem_req)
+    FROM {store_source(args.out)}
+    """).fetchone()
     print("Wrote:", args.out)
-    print("Rows:", len(out))
-    print("Arrival range (s):", out["arrival_time_s"].min(), "to", out["arrival_time_s"].max())
-    print("Mean cpu_req:", out["cpu_req"].mean(), "Mean mem_req:", out["mem_req"].mean())
+    print("Rows:", n)
+    print("Arrival range (s):", tmin, "to", tmax)
+    print("Mean cpu_req:", cpu_mean, "Mean mem_req:", mem_mean)
 
 
 if __name__ == "__main__":
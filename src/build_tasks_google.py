@@ -1,100 +1,307 @@
+import argparse
+import glob
+import json
+import os
+from typing import Dict
+
 import duckdb
 
-RAW_GLOB = "data/raw/*.csv.gz"
-OUT = "data/processed/google_tasks_clean.parquet"
+from convert_task_events import events_source
+from duck import configure
+from fsutil import atomic_write
+from task_store import store_source, write_task_store
+
+# converted shards (python src/convert_task_events.py); a *.csv.gz glob
+# reads the raw trace directly
+RAW_GLOB = "data/processed/task_events/*.parquet"
+# partitioned task store (see task_store.py)
+OUT = "data/processed/google_tasks_clean"
+# --incremental: carried-over task state
+STATE_DIR = "data/processed/google_ingest"
 
-# Google 2011 task_events mapping (confirmed by your inspection)
-# column00: time (microseconds)
-# column02: job_id
-# column03: task_index
-# column05: event_type
-# column09: cpu_request
-# column10: mem_request
+# Google 2011 task_events columns: see TASK_EVENTS_SCHEMA in convert_task_events.py
 TIME_SCALE = 1_000_000.0  # microseconds -> seconds
 
-con = duckdb.connect()
-con.execute("PRAGMA threads=4;")  # you can increase if you want (e.g., 8)
+# clean tasks ran at most MAX_RUNTIME_S and waited at most MAX_PENDING_S
+# between submit and first schedule; the carried-over state relies on both
+MAX_RUNTIME_S = 86400
+MAX_PENDING_S = 7 * 86400
+
+
+def create_event_views(con, files_sql: str, parquet: bool) -> None:
+    # files_sql: a quoted glob or a DuckDB list of quoted paths
+    con.execute(f"""
+    CREATE OR REPLACE VIEW task_events_raw AS
+    SELECT * FROM {events_source(files_sql, parquet)};
+    """)
 
-con.execute(f"""
-CREATE OR REPLACE VIEW task_events_raw AS
-SELECT * FROM read_csv_auto('{RAW_GLOB}', header=false);
-""")
+    con.execute(f"""
+    CREATE OR REPLACE VIEW task_events_s AS
+    SELECT
+      (time / {TIME_SCALE})::DOUBLE AS time_s,
+      job_id,
+      task_index,
+      event_type,
+      cpu_request AS cpu_req,
+      memory_request AS mem_req
+    FROM task_events_raw;
+    """)
 
-con.execute(f"""
-CREATE OR REPLACE VIEW task_events_s AS
+
+# Event types we use: SUBMIT=0, SCHEDULE=1, FAIL=3, FINISH=4, KILL=5, LOST=6
+# One grouped pass over the events: per task, the first SUBMIT, the
+# SCHEDULE/FINISH times as (small) lists and the max requests. The
+# ordering constraints (first SCHEDULE at/after submit, first FINISH
+# at/after that) are applied to the lists afterwards, per task. The last
+# SUBMIT and last FAIL/KILL/LOST times only serve to prune the
+# carried-over state (see STATE_SQL).
+LIFE_SQL = """
 SELECT
-  (column00::BIGINT / {TIME_SCALE})::DOUBLE AS time_s,
-  column02::BIGINT AS job_id,
-  column03::BIGINT AS task_index,
-  column05::INT    AS event_type,
-  TRY_CAST(column09 AS DOUBLE) AS cpu_req,
-  TRY_CAST(column10 AS DOUBLE) AS mem_req
-FROM task_events_raw;
-""")
-
-# Event types we use: SUBMIT=0, SCHEDULE=1, FINISH=4
-con.execute("""
-CREATE OR REPLACE TABLE tasks_clean AS
-WITH
-submit AS (
-  SELECT job_id, task_index, MIN(time_s) AS submit_time_s
-  FROM task_events_s
-  WHERE event_type = 0
-  GROUP BY job_id, task_index
-),
-sched AS (
-  SELECT e.job_id, e.task_index, MIN(e.time_s) AS start_time_s
-  FROM task_events_s e
-  JOIN submit s
-    ON e.job_id = s.job_id AND e.task_index = s.task_index
-  WHERE e.event_type = 1 AND e.time_s >= s.submit_time_s
-  GROUP BY e.job_id, e.task_index
-),
-finish AS (
-  SELECT e.job_id, e.task_index, MIN(e.time_s) AS end_time_s
-  FROM task_events_s e
-  JOIN sched sc
-    ON e.job_id = sc.job_id AND e.task_index = sc.task_index
-  WHERE e.event_type = 4 AND e.time_s >= sc.start_time_s
-  GROUP BY e.job_id, e.task_index
-),
-req AS (
+  job_id, task_index,
+  MIN(time_s) FILTER (WHERE event_type = 0) AS submit_time_s,
+  LIST(time_s) FILTER (WHERE event_type = 1) AS sched_times,
+  LIST(time_s) FILTER (WHERE event_type = 4) AS finish_times,
   -- Take max request observed on SUBMIT/SCHEDULE; drop tasks with missing reqs
+  MAX(cpu_req) FILTER (WHERE event_type IN (0, 1)) AS cpu_req,
+  MAX(mem_req) FILTER (WHERE event_type IN (0, 1)) AS mem_req,
+  MAX(time_s) FILTER (WHERE event_type = 0) AS last_submit_s,
+  MAX(time_s) FILTER (WHERE event_type IN (3, 5, 6)) AS last_end_s
+FROM {src}
+WHERE event_type IN (0, 1, 3, 4, 5, 6)
+GROUP BY job_id, task_index
+"""
+
+# Combine per-task partial states (e.g. carried-over state + a new batch)
+MERGE_SQL = """
+SELECT
+  job_id, task_index,
+  MIN(submit_time_s) AS submit_time_s,
+  flatten(LIST(sched_times)) AS sched_times,
+  flatten(LIST(finish_times)) AS finish_times,
+  MAX(cpu_req) AS cpu_req,
+  MAX(mem_req) AS mem_req,
+  MAX(last_submit_s) AS last_submit_s,
+  MAX(last_end_s) AS last_end_s
+FROM {src}
+GROUP BY job_id, task_index
+"""
+
+RESOLVE_SQL = """
+WITH sched AS (
   SELECT
-    job_id, task_index,
-    MAX(cpu_req) AS cpu_req,
-    MAX(mem_req) AS mem_req
-  FROM task_events_s
-  WHERE event_type IN (0, 1)
-  GROUP BY job_id, task_index
+    *,
+    list_min(list_filter(sched_times, x -> x >= submit_time_s)) AS start_time_s
+  FROM {src}
 )
 SELECT
-  s.submit_time_s AS arrival_time_s,
-  sc.start_time_s,
-  f.end_time_s,
-  (f.end_time_s - sc.start_time_s) AS runtime_s,
-  r.cpu_req,
-  r.mem_req
-FROM submit s
-JOIN sched sc USING (job_id, task_index)
-JOIN finish f USING (job_id, task_index)
-JOIN req r USING (job_id, task_index)
+  *,
+  list_min(list_filter(finish_times, x -> x >= start_time_s)) AS end_time_s
+FROM sched
+"""
+
+CLEAN_SQL = """
+SELECT
+  submit_time_s AS arrival_time_s,
+  start_time_s,
+  end_time_s,
+  (end_time_s - start_time_s) AS runtime_s,
+  cpu_req,
+  mem_req
+FROM {src}
 WHERE
-  runtime_s > 0
-  AND runtime_s <= 86400
+  submit_time_s IS NOT NULL
+  AND start_time_s IS NOT NULL
+  AND end_time_s IS NOT NULL
+  AND runtime_s > 0
+  AND runtime_s <= {max_runtime_s}
+  AND start_time_s - submit_time_s <= {max_pending_s}
   AND cpu_req IS NOT NULL AND mem_req IS NOT NULL
   AND cpu_req > 0 AND cpu_req <= 1
-  AND mem_req > 0 AND mem_req <= 1;
-""")
+  AND mem_req > 0 AND mem_req <= 1
+"""
+
+
+# Unfinished tasks that can still become clean rows. Shards are in time
+# order, so against the latest event seen (the horizon) we drop:
+# - tasks started more than max_runtime_s ago (runtime would exceed it),
+# - tasks submitted more than max_pending_s ago and not started yet
+#   (their wait would exceed it),
+# - tasks with no SUBMIT (only a later resubmit could make them clean,
+#   and that brings its own SCHEDULE/FINISH events),
+# - tasks whose last FAIL/KILL/LOST is after their last SUBMIT.
+STATE_SQL = """
+WITH horizon AS (
+  SELECT MAX(GREATEST(
+    submit_time_s,
+    list_max(sched_times),
+    list_max(finish_times),
+    last_end_s
+  )) AS t FROM {src}
+)
+SELECT
+  job_id, task_index, submit_time_s, sched_times, finish_times, cpu_req, mem_req,
+  last_submit_s, last_end_s
+FROM {src}, horizon
+WHERE end_time_s IS NULL
+  AND submit_time_s IS NOT NULL
+  AND (last_end_s IS NULL OR last_end_s < last_submit_s)
+  AND (
+    start_time_s >= horizon.t - {max_runtime_s}
+    OR (start_time_s IS NULL AND submit_time_s >= horizon.t - {max_pending_s})
+  )
+"""
+
+
+def save_state(con, resolved: str, state_dir: str, shards, batches: int, cutoffs: Dict) -> int:
+    """
+    Write the carried-over task state of `resolved` (see STATE_SQL) and the
+    manifest of processed shards and `cutoffs` to `state_dir`; return the
+    pending count.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    state_path = os.path.join(state_dir, "task_state.parquet")
+    manifest_path = os.path.join(state_dir, "manifest.json")
+
+    state_sql = STATE_SQL.format(src=resolved, **cutoffs)
+    con.execute(f"COPY ({state_sql}) TO '{state_path}.tmp' (FORMAT PARQUET);")
+    os.replace(state_path + ".tmp", state_path)
+    pending = con.execute(f"SELECT COUNT(*) FROM read_parquet('{state_path}')").fetchone()[0]
+
+    manifest = {"shards": list(shards), "batches": int(batches), **cutoffs}
+    atomic_write(manifest_path, lambda f: json.dump(manifest, f, indent=2), mode="w")
+    return pending
+
+
+def ingest_incremental(con, args) -> None:
+    """
+    Process only the shards not listed in `<state_dir>/manifest.json`.
+
+    Per-task partial state (first submit, schedule/finish times, max
+    requests) of tasks that have not finished yet is kept in
+    `<state_dir>/task_state.parquet` and merged with the new shards, so
+    tasks spanning shard boundaries resolve exactly as in a full build;
+    tasks that can no longer yield a clean row are dropped from it.
+    Finished tasks are added to the task store at `--out` as one
+    `batch-NNNNN.parquet` file per touched arrival-hour partition. Shards
+    are taken in name order, which for the Google trace is time order; a
+    request change on a task after it has been emitted is not applied,
+    and a task killed in one run and resubmitted in a later one starts
+    over from its resubmit. The cutoffs recorded in the manifest by the
+    first build are kept.
+    """
+    manifest_path = os.path.join(args.state_dir, "manifest.json")
+    state_path = os.path.join(args.state_dir, "task_state.parquet")
+
+    manifest = {"shards": [], "batches": 0}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    cutoffs = {
+        "max_runtime_s": manifest.get("max_runtime_s", MAX_RUNTIME_S),
+        "max_pending_s": manifest.get("max_pending_s", args.max_pending_s),
+    }
+    done = set(manifest["shards"])
+    new = [f for f in sorted(glob.glob(args.raw_glob)) if os.path.basename(f) not in done]
+    if not new:
+        print("No new shards.")
+        return
+
+    files_sql = "[" + ", ".join(f"'{f}'" for f in new) + "]"
+    create_event_views(con, files_sql, parquet=args.raw_glob.endswith(".parquet"))
+    con.execute(f"CREATE OR REPLACE TABLE batch_life AS {LIFE_SQL.format(src='task_events_s')};")
+    if os.path.exists(state_path):
+        parts = f"""(
+          SELECT * FROM read_parquet('{state_path}')
+          UNION ALL BY NAME
+          SELECT * FROM batch_life
+        ) AS parts"""
+        con.execute(f"CREATE OR REPLACE TABLE life AS {MERGE_SQL.format(src=parts)};")
+    else:
+        con.execute("CREATE OR REPLACE TABLE life AS SELECT * FROM batch_life;")
+    con.execute(f"CREATE OR REPLACE TABLE resolved AS {RESOLVE_SQL.format(src='life')};")
+
+    batch_id = int(manifest["batches"])
+    n = write_task_store(
+        con,
+        CLEAN_SQL.format(src="resolved", **cutoffs),
+        args.out,
+        file_name=f"batch-{batch_id:05d}.parquet",
+        replace=False,
+    )
+
+    # unfinished tasks carry over to the next run
+    pending = save_state(
+        con,
+        "resolved",
+        args.state_dir,
+        sorted(done | {os.path.basename(f) for f in new}),
+        batch_id + 1,
+        cutoffs,
+    )
+
+    print("New shards:", len(new))
+    print("Wrote:", args.out, f"(batch {batch_id})")
+    print("Clean tasks:", n)
+    print("Pending tasks carried over:", pending)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--raw_glob", default=RAW_GLOB)
+    p.add_argument("--out", default=OUT)
+    p.add_argument("--threads", type=int, default=os.cpu_count() or 4)
+    p.add_argument("--memory_limit", default=None, help="e.g. 200GB")
+    p.add_argument("--temp_dir", default=None, help="spill directory for large groupings")
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only process shards not yet in the manifest; append to --out",
+    )
+    p.add_argument(
+        "--state_dir",
+        default=STATE_DIR,
+        help="manifest and carried-over task state (written by full builds too)",
+    )
+    p.add_argument(
+        "--max_pending_s",
+        type=float,
+        default=MAX_PENDING_S,
+        help="drop tasks that waited longer than this for their first schedule",
+    )
+    args = p.parse_args()
+
+    con = duckdb.connect()
+    configure(con, args.threads, args.memory_limit, args.temp_dir)
+
+    if args.incremental:
+        ingest_incremental(con, args)
+        return
+
+    create_event_views(con, f"'{args.raw_glob}'", parquet=args.raw_glob.endswith(".parquet"))
+    life = f"({LIFE_SQL.format(src='task_events_s')}) AS life"
+    # materialized once: the store and the carried-over state both read it
+    con.execute(f"CREATE OR REPLACE TEMP TABLE resolved AS {RESOLVE_SQL.format(src=life)};")
+    cutoffs = {"max_runtime_s": MAX_RUNTIME_S, "max_pending_s": args.max_pending_s}
+    n = write_task_store(con, CLEAN_SQL.format(src="resolved", **cutoffs), args.out)
+    # record what this build covered, so a later --incremental run only
+    # picks up new shards and finishes the tasks still pending here
+    pending = save_state(
+        con,
+        "resolved",
+        args.state_dir,
+        sorted(os.path.basename(f) for f in glob.glob(args.raw_glob)),
+        0,
+        cutoffs,
+    )
+    tmin, tmax = con.execute(
+        f"SELECT MIN(arrival_time_s), MAX(arrival_time_s) FROM {store_source(args.out)}"
+    ).fetchone()
 
-con.execute("CREATE OR REPLACE VIEW stats AS SELECT COUNT(*) AS n FROM tasks_clean;")
-n = con.execute("SELECT n FROM stats").fetchone()[0]
-tmin, tmax = con.execute(
-    "SELECT MIN(arrival_time_s), MAX(arrival_time_s) FROM tasks_clean"
-).fetchone()
+    print("Wrote:", args.out)
+    print("Clean tasks:", n)
+    print("Arrival range (s):", tmin, "to", tmax)
+    print("Pending tasks carried over:", pending)
 
-con.execute(f"COPY tasks_clean TO '{OUT}' (FORMAT PARQUET);")
 
-print("Wrote:", OUT)
-print("Clean tasks:", n)
-print("Arrival range (s):", tmin, "to", tmax)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import duckdb
+
+RAW_GLOB = "data/raw/*.csv.gz"
+OUT_DIR = "data/processed/task_events"
+
+# Google 2011 task_events schema (all 13 columns, in file order)
+TASK_EVENTS_SCHEMA = [
+    ("time", "BIGINT"),  # microseconds
+    ("missing_info", "INTEGER"),
+    ("job_id", "BIGINT"),
+    ("task_index", "BIGINT"),
+    ("machine_id", "BIGINT"),
+    ("event_type", "INTEGER"),
+    ("user", "VARCHAR"),
+    ("scheduling_class", "INTEGER"),
+    ("priority", "INTEGER"),
+    ("cpu_request", "DOUBLE"),
+    ("memory_request", "DOUBLE"),
+    ("disk_space_request", "DOUBLE"),
+    ("different_machine_restriction", "BOOLEAN"),
+]
+
+# columns the downstream builders read
+KEEP_COLUMNS = ["time", "job_id", "task_index", "event_type", "cpu_request", "memory_request"]
+
+
+def csv_source(files_sql: str) -> str:
+    """read_csv() over raw shards with the schema given, not sniffed."""
+    cols = ", ".join(f"'{name}': '{typ}'" for name, typ in TASK_EVENTS_SCHEMA)
+    return f"read_csv({files_sql}, header=false, compression='gzip', columns={{{cols}}})"
+
+
+def events_source(files_sql: str, parquet: bool) -> str:
+    """
+    SQL table expression with (at least) KEEP_COLUMNS, over either
+    converted Parquet shards or the raw CSVs. `files_sql` is a quoted
+    glob or a DuckDB list of quoted paths.
+    """
+    if parquet:
+        return f"read_parquet({files_sql})"
+    return f"(SELECT {', '.join(KEEP_COLUMNS)} FROM {csv_source(files_sql)})"
+
+
+def out_path_for(raw_path: str, out_dir: str) -> str:
+    name = os.path.basename(raw_path)
+    for ext in (".gz", ".csv"):
+        if name.endswith(ext):
+            name = name[: -len(ext)]
+    return os.path.join(out_dir, name + ".parquet")
+
+
+def convert_shard(job: Tuple[str, str]) -> Tuple[str, int]:
+    """Convert one raw shard; skipped if its Parquet is newer than the CSV."""
+    raw_path, out_path = job
+    if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(raw_path):
+        return out_path, -1
+
+    con = duckdb.connect()
+    con.execute("PRAGMA threads=1;")  # parallelism comes from the shard pool
+    tmp = out_path + ".tmp"
+    con.execute(f"""
+    COPY (SELECT {', '.join(KEEP_COLUMNS)} FROM {csv_source(f"'{raw_path}'")})
+    TO '{tmp}' (FORMAT PARQUET, COMPRESSION ZSTD);
+    """)
+    n = con.execute(f"SELECT COUNT(*) FROM read_parquet('{tmp}')").fetchone()[0]
+    con.close()
+    os.replace(tmp, out_path)
+    return out_path, n
+
+
+def convert_all(raw_glob: str, out_dir: str, workers: int | None = None) -> List[Tuple[str, int]]:
+    files = sorted(glob.glob(raw_glob))
+    if not files:
+        raise SystemExit(f"No files match {raw_glob}")
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(f, out_path_for(f, out_dir)) for f in files]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [convert_shard(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(convert_shard, jobs))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--raw_glob", default=RAW_GLOB)
+    p.add_argument("--out_dir", default=OUT_DIR)
+    p.add_argument("--workers", type=int, default=None)
+    args = p.parse_args()
+
+    done = convert_all(args.raw_glob, args.out_dir, workers=args.workers)
+    converted = [n for _, n in done if n >= 0]
+    print(f"Shards: {len(done)} (converted {len(converted)}, up to date {len(done) - len(converted)})")
+    print("Rows converted:", sum(converted))
+    print("Wrote:", args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+
+
+def configure(con, threads: int, memory_limit: str | None, temp_dir: str | None) -> None:
+    """Connection settings shared by the DuckDB task builders."""
+    con.execute(f"PRAGMA threads={int(threads)};")
+    if memory_limit:
+        con.execute(f"SET memory_limit='{memory_limit}';")
+    if temp_dir:
+        os.makedirs(temp_dir, exist_ok=True)
+        con.execute(f"SET temp_directory='{temp_dir}';")
+    # no query here needs input order; lets DuckDB stream and spill freely
+    con.execute("SET preserve_insertion_order=false;")
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+from multiprocessing import get_context
+from typing import Dict, List, Tuple
+
+from mdp_policy import CompiledPolicy
+from sim_engine import Workload, make_workload_from_parquet, simulate
+
+SUMMARY_KEYS = [
+    "tasks",
+    "partial",
+    "mean_wait_s",
+    "p95_wait_s",
+    "p99_wait_s",
+    "sla60_violation",
+    "sla120_violation",
+    "vm_seconds",
+]
+
+# per-worker caches: each dataset is loaded at most once per process
+_workloads: Dict[str, Workload] = {}
+_policies: Dict[str, CompiledPolicy] = {}
+
+
+def dataset_bounds(ds: Dict) -> Tuple[int, int, int]:
+    """k_min, k_max, delta: explicit in the dataset entry or from its MDP policy."""
+    if all(key in ds for key in ("k_min", "k_max", "delta")):
+        return int(ds["k_min"]), int(ds["k_max"]), int(ds["delta"])
+    pol = CompiledPolicy.load(ds["mdp_policy"])
+    return (
+        int(ds.get("k_min", pol.k_min)),
+        int(ds.get("k_max", pol.k_max)),
+        int(ds.get("delta", pol.delta)),
+    )
+
+
+def _resolve(v, bounds: Dict[str, int]):
+    # grid values may name the dataset's k bounds ("k_min" / "k_max")
+    return bounds[v] if isinstance(v, str) and v in bounds else v
+
+
+def _grid_values(spec, bounds: Dict[str, int]) -> List:
+    if isinstance(spec, dict):
+        start, stop = _resolve(spec["start"], bounds), _resolve(spec["stop"], bounds)
+        return list(range(int(start), int(stop), int(spec.get("step", 1))))
+    return [_resolve(v, bounds) for v in spec]
+
+
+def expand_jobs(matrix: Dict, only: List[str] | None = None) -> List[Dict]:
+    """Expand datasets x policies x parameter grids into simulate() jobs."""
+    import pyarrow.parquet as pq
+
+    jobs: List[Dict] = []
+    seen = set()
+    rows_by_ds: Dict[str, int] = {}
+    for exp in matrix["experiments"]:
+        for name in exp["datasets"]:
+            if only and name not in only:
+                continue
+            ds = matrix["datasets"][name]
+            k_min, k_max, delta = dataset_bounds(ds)
+            bounds = {"k_min": k_min, "k_max": k_max}
+            if name not in rows_by_ds:
+                rows_by_ds[name] = pq.ParquetFile(ds["workload"]).metadata.num_rows
+
+            grid = exp.get("grid", {})
+            names = sorted(grid)
+            for values in itertools.product(*(_grid_values(grid[g], bounds) for g in names)):
+                params = dict(zip(names, values))
+                params.setdefault("static_k", k_min)
+                params.update(k_min=k_min, k_max=k_max, delta=delta)
+                ident = (name, exp["policy"], tuple(sorted(params.items())))
+                if ident in seen:  # overlapping grids
+                    continue
+                seen.add(ident)
+                jobs.append(
+                    {
+                        "dataset": name,
+                        "workload": ds["workload"],
+                        "mdp_policy": ds.get("mdp_policy"),
+                        "policy": exp["policy"],
+                        "params": params,
+                        "cost": _estimated_cost(exp["policy"], params, rows_by_ds[name]),
+                    }
+                )
+    # longest jobs first, so the pool is not left waiting on a late straggler
+    jobs.sort(key=lambda j: j["cost"], reverse=True)
+    return jobs
+
+
+def _estimated_cost(policy: str, params: Dict, n_rows: int) -> float:
+    # under-provisioned static runs keep long queues and are the slowest
+    if policy == "static":
+        return n_rows * params["k_max"] / max(1, int(params["static_k"]))
+    return float(n_rows)
+
+
+def _run_job(job: Dict) -> Dict:
+    path = job["workload"]
+    if path not in _workloads:
+        _workloads[path] = make_workload_from_parquet(path)
+    kwargs = dict(job["params"])
+    if job["policy"] == "mdp":
+        pol_path = job["mdp_policy"]
+        if pol_path not in _policies:
+            _policies[pol_path] = CompiledPolicy.load(pol_path)
+        kwargs["mdp_policy"] = _policies[pol_path]
+
+    r = simulate(tasks=_workloads[path], policy_name=job["policy"], **kwargs)
+    row = {"dataset": job["dataset"], "policy": job["policy"]}
+    row.update(job["params"])
+    row.update({key: r[key] for key in SUMMARY_KEYS})
+    return row
+
+
+def run_matrix(jobs: List[Dict], workers: int | None = None) -> List[Dict]:
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [_run_job(j) for j in jobs]
+    with get_context().Pool(processes=workers) as pool:
+        return list(pool.imap_unordered(_run_job, jobs, chunksize=1))
+
+
+def write_table(rows: List[Dict], out_path: str) -> None:
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    df["vm_hours"] = df["vm_seconds"] / 3600.0
+    df = df.sort_values(["dataset", "policy", "static_k"]).reset_index(drop=True)
+    df.to_parquet(out_path, index=False)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--matrix", default="experiments.json")
+    p.add_argument("--out", default="results/experiments.parquet")
+    p.add_argument("--only", nargs="*", default=None, help="dataset names to run")
+    p.add_argument("--workers", type=int, default=None)
+    args = p.parse_args()
+
+    with open(args.matrix) as f:
+        matrix = json.load(f)
+
+    if args.only:
+        unknown = sorted(set(args.only) - set(matrix["datasets"]))
+        if unknown:
+            raise SystemExit(f"Unknown datasets {unknown}; {args.matrix} has {sorted(matrix['datasets'])}")
+    jobs = expand_jobs(matrix, only=args.only)
+    if not jobs:
+        raise SystemExit(f"No jobs: no experiment in {args.matrix} covers the selected datasets.")
+    print("Jobs:", len(jobs))
+
+    rows = run_matrix(jobs, workers=args.workers)
+    write_table(rows, args.out)
+    print("Wrote:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import os
+from typing import IO, Callable
+
+
+def atomic_write(path: str, write: Callable[[IO], None], mode: str = "wb", best_effort: bool = False) -> bool:
+    """
+    Write `path` through `write(f)` into a per-process temp file and
+    `os.replace` it over `path`, so readers and concurrent writers only
+    ever see a complete file. With `best_effort`, an OSError (e.g. a
+    read-only cache directory) skips the write and returns False.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, mode) as f:
+            write(f)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        if not best_effort:
+            raise
+        return False
+    return True
@@ -2,26 +2,29 @@ import glob
 import duckdb
 import pandas as pd
 
+from convert_task_events import OUT_DIR, events_source
+
 pd.set_option("display.max_columns", 50)
 pd.set_option("display.width", 200)
 
-files = sorted(glob.glob("data/raw/*.csv.gz"))
+# converted Parquet shards if present, else the raw CSVs (typed, not sniffed)
+files = sorted(glob.glob(f"{OUT_DIR}/*.parquet"))
+parquet = bool(files)
+if not files:
+    files = sorted(glob.glob("data/raw/*.csv.gz"))
 if not files:
-    raise SystemExit("No .csv.gz files found in data/raw")
+    raise SystemExit(f"No .parquet files in {OUT_DIR} and no .csv.gz files in data/raw")
 
 path = files[0]
 con = duckdb.connect()
+src = events_source(f"'{path}'", parquet)
 
-df = con.execute(
-    f"SELECT * FROM read_csv_auto('{path}', header=false) LIMIT 5"
-).fetchdf()
+df = con.execute(f"SELECT * FROM {src} LIMIT 5").fetchdf()
 
 print("Sample file:", path)
 print(df)
 print("\nColumn names:", list(df.columns))
 print("Column count:", len(df.columns))
 
-tmin, tmax = con.execute(
-    f"SELECT MIN(column00), MAX(column00) FROM read_csv_auto('{path}', header=false)"
-).fetchone()
+tmin, tmax = con.execute(f"SELECT MIN(time), MAX(time) FROM {src}").fetchone()
 print("\nTime range raw:", tmin, "to", tmax)
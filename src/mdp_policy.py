@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Dict, Tuple
+import zipfile
+
+import numpy as np
+
+
+class CompiledPolicy:
+    """
+    Dense MDP policy: `table[k, q_bin]` is the scaling action (int8) and
+    `q_bins` are the backlog bin edges used to build it.
+
+    Single lookups go through plain Python lists and `bisect` (no NumPy
+    per-call overhead); `actions_for` evaluates many states at once.
+    Rows outside [k_min, k_max] hold 0 ('do nothing'), the same default
+    `simulate` uses for states missing from the pickled dict.
+    """
+
+    def __init__(
+        self,
+        table: np.ndarray,
+        q_bins: np.ndarray,
+        k_min: int,
+        k_max: int,
+        delta: int,
+    ) -> None:
+        self.table = table
+        self.q_bins = q_bins
+        self.k_min = int(k_min)
+        self.k_max = int(k_max)
+        self.delta = int(delta)
+        self.n_q = len(q_bins) - 1
+        self._rows = table.tolist()
+        self._edges = [float(x) for x in q_bins]
+
+    def qbin(self, x: float) -> int:
+        # same as np.digitize([x], q_bins)[0] - 1, clipped to a valid bin
+        idx = bisect_right(self._edges, x) - 1
+        if idx < 0:
+            return 0
+        if idx >= self.n_q:
+            return self.n_q - 1
+        return idx
+
+    def action(self, k: int, q_work: float) -> int:
+        if k < 0 or k >= len(self._rows):
+            return 0
+        return self._rows[k][self.qbin(q_work)]
+
+    def actions_for(self, k: np.ndarray, q_work: np.ndarray) -> np.ndarray:
+        """Actions for arrays of states (k, queued work)."""
+        k = np.asarray(k, dtype=np.int64)
+        qb = np.searchsorted(self.q_bins, np.asarray(q_work, dtype=float), side="right") - 1
+        qb = np.clip(qb, 0, self.n_q - 1)
+        inside = (k >= 0) & (k < self.table.shape[0])
+        out = np.zeros(np.broadcast(k, qb).shape, dtype=np.int64)
+        out[inside] = self.table[k[inside], qb[inside]]
+        return out
+
+    def to_dict(self) -> Dict[Tuple[int, int], int]:
+        return {
+            (k, qb): int(self.table[k, qb])
+            for k in range(self.k_min, self.k_max + 1)
+            for qb in range(self.n_q)
+        }
+
+    def save(self, path: str) -> None:
+        # uncompressed so members can be memory-mapped by `load`
+        np.savez(
+            path,
+            table=self.table,
+            q_bins=self.q_bins,
+            meta=np.array([self.k_min, self.k_max, self.delta], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CompiledPolicy":
+        arrays = _load_npz_mmap(path) if mmap else dict(np.load(path))
+        k_min, k_max, delta = (int(x) for x in arrays["meta"])
+        return cls(arrays["table"], np.asarray(arrays["q_bins"]), k_min, k_max, delta)
+
+
+def compile_policy(
+    policy: Dict[Tuple[int, int], int],
+    q_bins: np.ndarray,
+    k_min: int,
+    k_max: int,
+    delta: int,
+) -> CompiledPolicy:
+    n_q = len(q_bins) - 1
+    table = np.zeros((k_max + 1, n_q), dtype=np.int8)
+    for (k, qb), a in policy.items():
+        if 0 <= k <= k_max and 0 <= qb < n_q:
+            table[k, qb] = a
+    return CompiledPolicy(table, np.asarray(q_bins, dtype=float), k_min, k_max, delta)
+
+
+def _load_npz_mmap(path: str) -> Dict[str, np.ndarray]:
+    # np.load ignores mmap_mode for .npz; map each stored member directly
+    out: Dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                out[name] = np.load(zf.open(info))
+                continue
+            # local file header: 30 fixed bytes + name + extra field
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            out[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                shape=shape,
+                order="F" if fortran else "C",
+                offset=f.tell(),
+            )
+    return out
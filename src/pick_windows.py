@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+from typing import Dict, List, Tuple
+
+import duckdb
+import numpy as np
+
+from fsutil import atomic_write
+from task_store import partitions_predicate, store_source, window_predicate
+
+METRICS = ("arrivals", "work")
+
+
+def _store_files(path: str) -> List[str]:
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*", "*.parquet")))
+    return [path]
+
+
+def _store_stamp(path: str) -> str:
+    h = hashlib.sha256()
+    for f in _store_files(path):
+        st = os.stat(f)
+        h.update(f"{os.path.relpath(f, path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def _hist_path(path: str, bin_s: int) -> str:
+    if os.path.isdir(path):
+        return os.path.join(path, f"_hist_{bin_s}s.npz")
+    return f"{path}.hist_{bin_s}s.npz"
+
+
+def arrival_histogram(path: str, bin_s: int, con=None, cache: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Dense per-bin arrival histogram of a task store (or single Parquet file).
+
+    Returns `first_bin` (index of bin 0, i.e. bin b covers
+    [(first_bin + b) * bin_s, (first_bin + b + 1) * bin_s)), `arrivals`
+    (task count) and `work` (sum of runtime * max(cpu, mem), the
+    dominant-resource seconds used as the backlog signal in the simulator).
+    Cached next to the data and reused while the store files are unchanged.
+    """
+    hist_path = _hist_path(path, bin_s)
+    stamp = _store_stamp(path)
+    if cache and os.path.exists(hist_path):
+        try:
+            with np.load(hist_path) as z:
+                if str(z["stamp"]) == stamp:
+                    return {k: z[k] for k in ("first_bin", "arrivals", "work")}
+        except (OSError, ValueError, KeyError):
+            pass
+
+    con = con or duckdb.connect()
+    rows = con.execute(f"""
+    SELECT
+      CAST(FLOOR(arrival_time_s / {bin_s}) AS BIGINT) AS b,
+      COUNT(*) AS n,
+      SUM(runtime_s * GREATEST(cpu_req, mem_req)) AS work
+    FROM {store_source(path)}
+    GROUP BY 1
+    """).fetchnumpy()
+    b = rows["b"].astype(np.int64)
+    if len(b) == 0:
+        raise SystemExit(f"No tasks in {path}")
+    first = int(b.min())
+    arrivals = np.zeros(int(b.max()) - first + 1, dtype=np.int64)
+    work = np.zeros(len(arrivals), dtype=np.float64)
+    arrivals[b - first] = rows["n"]
+    work[b - first] = rows["work"]
+    hist = {"first_bin": np.int64(first), "arrivals": arrivals, "work": work}
+
+    if cache:
+        atomic_write(hist_path, lambda f: np.savez(f, stamp=np.str_(stamp), **hist), best_effort=True)
+    return hist
+
+
+def top_windows(values: np.ndarray, win_bins: int, n: int) -> List[Tuple[int, float]]:
+    """
+    The `n` best non-overlapping windows of `win_bins` consecutive bins, as
+    (start bin, window sum), best first. Window sums come from one
+    cumulative-sum pass; windows are then taken greedily by sum (earliest
+    first on ties), skipping any that overlap one already taken.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    if len(v) < win_bins:
+        v = np.concatenate([v, np.zeros(win_bins - len(v))])
+    csum = np.concatenate(([0.0], np.cumsum(v)))
+    sums = csum[win_bins:] - csum[:-win_bins]
+
+    order = np.argsort(-sums, kind="stable")
+    taken = np.zeros(len(sums), dtype=bool)  # starts blocked by a chosen window
+    picked: List[Tuple[int, float]] = []
+    for s in order:
+        if len(picked) == n:
+            break
+        if taken[s]:
+            continue
+        picked.append((int(s), float(sums[s])))
+        taken[max(0, s - win_bins + 1) : s + win_bins] = True
+    return picked
+
+
+def pick_windows(
+    path: str,
+    window_s: int,
+    bin_s: int,
+    n: int = 1,
+    metric: str = "arrivals",
+    con=None,
+) -> List[Tuple[float, float, float]]:
+    """Top-`n` non-overlapping (t0, t1, score) windows of length `window_s`."""
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}")
+    if window_s % bin_s:
+        raise ValueError("window_s must be a multiple of bin_s")
+    hist = arrival_histogram(path, bin_s, con=con)
+    first = int(hist["first_bin"])
+    return [
+        ((first + s) * bin_s, (first + s) * bin_s + window_s, score)
+        for s, score in top_windows(hist[metric], window_s // bin_s, n)
+    ]
+
+
+def slice_windows(con, path: str, windows: List[Tuple[float, float]], outs: List[str]) -> List[int]:
+    """
+    Write the tasks of each [t0, t1) window to its output file. The store
+    is scanned once (pruned to the windows' partitions); each window is
+    then written from the small in-memory selection.
+    """
+    cases = "\n".join(
+        f"      WHEN {window_predicate(path, t0, t1)} THEN {i}" for i, (t0, t1) in enumerate(windows)
+    )
+    con.execute(f"""
+    CREATE OR REPLACE TEMP TABLE picked AS
+    SELECT * FROM (
+      SELECT
+        CASE
+    {cases}
+        END AS window_id,
+        arrival_time_s, runtime_s, cpu_req, mem_req
+      FROM {store_source(path)}
+      WHERE {partitions_predicate(path, windows)}
+        AND ({" OR ".join(f"({window_predicate(path, t0, t1)})" for t0, t1 in windows)})
+    )
+    WHERE window_id IS NOT NULL;
+    """)
+    counts = []
+    for i, out in enumerate(outs):
+        con.execute(f"""
+        COPY (
+          SELECT arrival_time_s, runtime_s, cpu_req, mem_req
+          FROM picked
+          WHERE window_id = {i}
+          ORDER BY arrival_time_s
+        ) TO '{out}' (FORMAT PARQUET);
+        """)
+        counts.append(con.execute(f"SELECT COUNT(*) FROM picked WHERE window_id = {i}").fetchone()[0])
+    return counts
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--store", default="data/processed/google_tasks_clean")
+    p.add_argument("--window_s", type=int, default=2 * 3600)
+    p.add_argument("--bin_s", type=int, default=60)
+    p.add_argument("--top", type=int, default=1)
+    p.add_argument("--metric", choices=METRICS, default="arrivals")
+    p.add_argument(
+        "--out_prefix",
+        default=None,
+        help="write window r to <out_prefix>_<r>.parquet (omit to only list windows)",
+    )
+    args = p.parse_args()
+
+    con = duckdb.connect()
+    windows = pick_windows(args.store, args.window_s, args.bin_s, args.top, args.metric, con=con)
+    outs = [f"{args.out_prefix}_{r}.parquet" for r in range(len(windows))] if args.out_prefix else []
+    counts = slice_windows(con, args.store, [w[:2] for w in windows], outs) if outs else []
+
+    for r, (t0, t1, score) in enumerate(windows):
+        line = f"#{r}: {t0} to {t1} s, {args.metric}={score:g}"
+        if outs:
+            line += f", tasks={counts[r]} -> {outs[r]}"
+        print(line)
+    if outs:
+        with open(f"{args.out_prefix}_windows.json", "w") as f:
+            json.dump(
+                [{"rank": r, "t0": t0, "t1": t1, args.metric: score} for r, (t0, t1, score) in enumerate(windows)],
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import json
-import pickle
 import numpy as np
 import matplotlib.pyplot as plt
 
-from sim_engine import make_workload_from_parquet, simulate
+from mdp_policy import CompiledPolicy
+from sim_cache import ResultCache
 
 
 def save_plot(res, out_prefix: str):
@@ -36,16 +36,14 @@ def save_plot(res, out_prefix: str):
 
 def main():
     workload_path = "data/processed/alibaba/alibaba_tasks_24h.parquet"
-    tasks = make_workload_from_parquet(workload_path)
+    # reruns with unchanged parameters are served from the on-disk cache
+    cache = ResultCache()
 
-    with open("results/alibaba_mdp_policy.pkl", "rb") as f:
-        mdp = pickle.load(f)
-    q_bins = np.load("results/alibaba_mdp_q_bins.npy")
+    mdp_policy = CompiledPolicy.load("results/alibaba_mdp_policy.npz")
 
-    k_min = int(mdp["k_min"])
-    k_max = int(mdp["k_max"])
-    delta = int(mdp["delta"])
-    mdp_policy = mdp["policy"]
+    k_min = mdp_policy.k_min
+    k_max = mdp_policy.k_max
+    delta = mdp_policy.delta
 
     print("Using k_min,k_max:", k_min, k_max)
 
@@ -55,8 +53,9 @@ def main():
     results = []
 
     # 1) static
-    r_static = simulate(
-        tasks=tasks,
+    r_static = cache.simulate(
+        workload_path=workload_path,
+        with_ts=True,
         policy_name="static",
         k_min=k_min,
         k_max=k_max,
@@ -69,8 +68,9 @@ def main():
 
     print("THRESH PARAMS:", "up_th=", 10000.0, "down_th=", 2000.0, "step_up=", 20, "step_down=", 10)
     
-    r_thr = simulate(
-        tasks=tasks,
+    r_thr = cache.simulate(
+        workload_path=workload_path,
+        with_ts=True,
         policy_name="threshold",
         k_min=k_min,
         k_max=k_max,
@@ -84,15 +84,15 @@ def main():
     results.append(r_thr)
 
     # 3) mdp
-    r_mdp = simulate(
-        tasks=tasks,
+    r_mdp = cache.simulate(
+        workload_path=workload_path,
+        with_ts=True,
         policy_name="mdp",
         k_min=k_min,
         k_max=k_max,
         static_k=k_min,
         delta=delta,
         mdp_policy=mdp_policy,
-        q_bins=q_bins,
     )
     results.append(r_mdp)
 
@@ -0,0 +1,58 @@
+import argparse
+import json
+import pickle
+
+from sim_engine import make_workload_from_parquet
+from sweep_engine import search_static_k
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--workload", default="data/processed/google_tasks_2h.parquet")
+    p.add_argument("--mdp", default="results/mdp_policy.pkl", help="for k_min/k_max/delta")
+    p.add_argument("--sla60", type=float, required=True, help="target P(wait > 60s)")
+    p.add_argument("--radius", type=int, default=2, help="curve points on each side")
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    tasks = make_workload_from_parquet(args.workload)
+
+    with open(args.mdp, "rb") as f:
+        mdp = pickle.load(f)
+    k_min = int(mdp["k_min"])
+    k_max = int(mdp["k_max"])
+    delta = int(mdp["delta"])
+
+    res = search_static_k(
+        tasks,
+        sla60=args.sla60,
+        k_lo=max(1, k_min),
+        k_hi=k_max,
+        curve_radius=args.radius,
+        k_min=k_min,
+        k_max=k_max,
+        delta=delta,
+    )
+    rows = [
+        {
+            "static_k": r["static_k"],
+            "vm_hours": r["vm_seconds"] / 3600.0,
+            "p95_wait_s": r["p95_wait_s"],
+            "sla60": r["sla60_violation"],
+            "sla120": r["sla120_violation"],
+        }
+        for r in res["curve"]
+    ]
+
+    print("Smallest static_k with sla60 <=", args.sla60, ":", res["static_k"])
+    print("Simulations:", res["simulations"])
+    print(json.dumps(rows, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"static_k": res["static_k"], "sla60": args.sla60, "curve": rows}, f, indent=2)
+        print("Wrote:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from fsutil import atomic_write
+from mdp_policy import CompiledPolicy
+from sim_engine import ENGINE_VERSION, Workload, make_workload_from_parquet, simulate
+
+DEFAULT_CACHE_DIR = ".sim_cache"
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# runs whose outcome depends on more than (workload, parameters)
+_UNCACHEABLE = ("resume", "stop_at", "max_wall_s")
+
+
+def workload_fingerprint(workload: Workload) -> str:
+    """Content hash of the workload arrays."""
+    h = hashlib.sha256()
+    for a in (workload.arrival, workload.runtime, workload.cpu, workload.mem):
+        h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def _canonical(x):
+    # JSON-able, order-independent form of simulate() keyword values
+    if isinstance(x, CompiledPolicy):
+        return {
+            "compiled_policy": _canonical(np.asarray(x.table)),
+            "q_bins": _canonical(np.asarray(x.q_bins)),
+            "meta": [x.k_min, x.k_max, x.delta],
+        }
+    if isinstance(x, np.ndarray):
+        digest = hashlib.sha256(np.ascontiguousarray(x).tobytes()).hexdigest()
+        return {"ndarray": digest, "dtype": str(x.dtype), "shape": list(x.shape)}
+    if isinstance(x, dict):
+        return sorted([_canonical(k), _canonical(v)] for k, v in x.items())
+    if isinstance(x, (list, tuple)):
+        return [_canonical(v) for v in x]
+    if isinstance(x, np.generic):
+        return x.item()
+    return x
+
+
+def params_key(workload_key: str, sim_kwargs: Dict) -> str:
+    blob = json.dumps(
+        {
+            "engine": ENGINE_VERSION,
+            "workload": workload_key,
+            "params": _canonical(sim_kwargs),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of simulate() results keyed by (workload content, simulate
+    parameters, ENGINE_VERSION), with size-bounded LRU eviction.
+
+    Each entry is `<key>.pkl` (summary) plus, when time series were asked
+    for, `<key>.ts.pkl`. Hits refresh the files' mtime, which is the LRU
+    order used when the directory grows past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._workloads: Dict[str, Workload] = {}
+
+    def file_fingerprint(self, path: str) -> str:
+        """Content hash of a workload file, memoized on (path, size, mtime)."""
+        st = os.stat(path)
+        memo_path = os.path.join(self.cache_dir, "fingerprints.json")
+        memo: Dict[str, List] = {}
+        try:
+            with open(memo_path) as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            pass  # missing or unreadable memo: rehash and rewrite it
+        if not isinstance(memo, dict):
+            memo = {}
+        real = os.path.realpath(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        if real in memo and memo[real][:2] == stamp:
+            return memo[real][2]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        memo[real] = stamp + [h.hexdigest()]
+        atomic_write(memo_path, lambda f: json.dump(memo, f), mode="w")
+        return memo[real][2]
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return base + ".pkl", base + ".ts.pkl"
+
+    def get(self, key: str, with_ts: bool = False) -> Dict | None:
+        summary_path, ts_path = self._paths(key)
+        if not os.path.exists(summary_path) or (with_ts and not os.path.exists(ts_path)):
+            return None
+        try:
+            with open(summary_path, "rb") as f:
+                res = pickle.load(f)
+            if with_ts:
+                with open(ts_path, "rb") as f:
+                    res["ts"] = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        for p in (summary_path, ts_path) if with_ts else (summary_path,):
+            os.utime(p)
+        return res
+
+    def put(self, key: str, res: Dict, with_ts: bool = False) -> None:
+        summary_path, ts_path = self._paths(key)
+        summary = {k: v for k, v in res.items() if k != "ts"}
+        self._write(summary_path, summary)
+        if with_ts:
+            self._write(ts_path, res["ts"])
+        self.evict()
+
+    def _write(self, path: str, obj) -> None:
+        atomic_write(path, lambda f: pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            p = os.path.join(self.cache_dir, name)
+            st = os.stat(p)
+            entries.append((st.st_mtime_ns, st.st_size, p))
+            total += st.st_size
+        entries.sort()
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(p)
+            total -= size
+
+    def simulate(
+        self,
+        tasks: Workload | None = None,
+        workload_path: str | None = None,
+        with_ts: bool = False,
+        **sim_kwargs,
+    ) -> Dict:
+        """
+        simulate() through the cache. Give either a loaded `tasks` Workload
+        (keyed by its content) or a `workload_path`, keyed by the file's
+        content hash and only loaded on a miss. Time series are stored and
+        returned only if `with_ts`.
+        """
+        if (tasks is None) == (workload_path is None):
+            raise ValueError("Pass exactly one of tasks or workload_path.")
+        if any(sim_kwargs.get(name) is not None for name in _UNCACHEABLE):
+            if tasks is None:
+                tasks = self._load(workload_path)
+            return simulate(tasks=tasks, **sim_kwargs)
+
+        if tasks is not None:
+            wkey = workload_fingerprint(tasks)
+        else:
+            wkey = self.file_fingerprint(workload_path)
+        key = params_key(wkey, sim_kwargs)
+
+        res = self.get(key, with_ts=with_ts)
+        if res is not None:
+            return res
+
+        if tasks is None:
+            tasks = self._load(workload_path)
+        res = simulate(tasks=tasks, **sim_kwargs)
+        self.put(key, res, with_ts=with_ts)
+        if not with_ts:
+            res.pop("ts", None)
+        return res
+
+    def _load(self, path: str) -> Workload:
+        if path not in self._workloads:
+            self._workloads[path] = make_workload_from_parquet(path)
+        return self._workloads[path]
@@ -1,11 +1,21 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Deque, Dict, List, Tuple
+import copy
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, Iterator, List, Sequence, Tuple
+from bisect import bisect_right
 from collections import deque
 import heapq
+import json
+import math
+import os
+import time
 import numpy as np
 
+from fsutil import atomic_write
+from mdp_policy import CompiledPolicy
+from wait_sketch import WaitSketch
+
 
 @dataclass
 class Task:
@@ -15,42 +25,399 @@ class Task:
     mem: float
 
 
+class ClusterState:
+    """
+    Per-VM cpu/mem usage in flat arrays plus a min-tree over the active
+    slots, so First-Fit finds the lowest fitting slot without scanning.
+
+    VM ids are stable (completion entries refer to them) while their slots
+    move: `vm_at[s]` is the VM in slot s, `slot_of` the inverse, and slots
+    [0, k) are the active VMs. Any idle active VM can be released: the
+    last active VM moves into its slot. Running-task counts per VM and the
+    list of idle active VMs make finding and releasing one O(1) apart from
+    the two leaf updates.
+
+    Inner nodes hold the minimum used cpu and used mem of their subtree
+    (inactive slots count as +inf); a subtree is skipped when even its
+    minimum cannot take the task. Leaves are compared with exactly the
+    test First-Fit uses (`used + req <= 1.0`), so placements are identical
+    to a linear scan over the active slots.
+    """
+
+    def __init__(self, n_vms: int, k: int, vm_at: Sequence[int] | None = None) -> None:
+        size = 1
+        while size < max(1, n_vms):
+            size *= 2
+        self.n_vms = n_vms
+        self.k = 0
+        self.used_cpu: List[float] = [0.0] * n_vms
+        self.used_mem: List[float] = [0.0] * n_vms
+        self.n_tasks: List[int] = [0] * n_vms
+        self.vm_at: List[int] = list(vm_at) if vm_at is not None else list(range(n_vms))
+        self.slot_of: List[int] = [0] * n_vms
+        for slot, vm_id in enumerate(self.vm_at):
+            self.slot_of[vm_id] = slot
+        self.idle: List[int] = []  # idle active VMs, in no particular order
+        self._idle_pos: List[int] = [-1] * n_vms
+        self._size = size
+        self._min_cpu = [float("inf")] * (2 * size)
+        self._min_mem = [float("inf")] * (2 * size)
+        self.set_active(k)
+
+    @classmethod
+    def restore(
+        cls,
+        n_vms: int,
+        k: int,
+        used_cpu: List[float],
+        used_mem: List[float],
+        vm_at: List[int],
+        running: Iterable[int],
+    ) -> "ClusterState":
+        """Rebuild a snapshot: per-VM usage, slot order and the VM of every running task."""
+        order = list(vm_at) + list(range(len(vm_at), n_vms))
+        cluster = cls(n_vms, 0, order)
+        cluster.used_cpu[: len(used_cpu)] = used_cpu
+        cluster.used_mem[: len(used_mem)] = used_mem
+        for vm_id in running:
+            cluster.n_tasks[vm_id] += 1
+        cluster.set_active(k)
+        return cluster
+
+    def is_idle(self, vm_id: int) -> bool:
+        return self.n_tasks[vm_id] == 0
+
+    def is_active(self, vm_id: int) -> bool:
+        return self.slot_of[vm_id] < self.k
+
+    def set_active(self, k: int) -> None:
+        """Make slots [0, k) the active set (VMs leaving it should be idle)."""
+        inf = float("inf")
+        for slot in range(min(self.k, k), max(self.k, k)):
+            vm_id = self.vm_at[slot]
+            if slot < k:
+                self._update(slot, self.used_cpu[vm_id], self.used_mem[vm_id])
+                if self.n_tasks[vm_id] == 0:
+                    self._push_idle(vm_id)
+            else:
+                self._update(slot, inf, inf)
+                self._drop_idle(vm_id)
+        self.k = k
+
+    def release_idle(self, n: int) -> int:
+        """Deactivate up to `n` idle VMs, wherever their slots are; returns how many."""
+        released = 0
+        while released < n and self.idle:
+            vm_id = self.idle[-1]
+            self._drop_idle(vm_id)
+            slot, last = self.slot_of[vm_id], self.k - 1
+            other = self.vm_at[last]
+            self.vm_at[slot], self.vm_at[last] = other, vm_id
+            self.slot_of[other], self.slot_of[vm_id] = slot, last
+            self.k = last
+            if slot != last:
+                self._update(slot, self.used_cpu[other], self.used_mem[other])
+            self._update(last, float("inf"), float("inf"))
+            released += 1
+        return released
+
+    def first_fit(self, cpu: float, mem: float) -> int:
+        """Id of the VM in the lowest active slot with room for (cpu, mem), or -1."""
+        mc, mm = self._min_cpu, self._min_mem
+        size = self._size
+        node = 1
+        while True:
+            if mc[node] + cpu <= 1.0 and mm[node] + mem <= 1.0:
+                if node >= size:
+                    return self.vm_at[node - size]
+                node *= 2
+                continue
+            # dead end: move to the next unvisited subtree to the right
+            while node & 1:
+                node >>= 1
+            if node == 0:
+                return -1
+            node += 1
+
+    def first_fit_except(self, cpu: float, mem: float, skip: int) -> int:
+        """First-Fit over the active VMs other than `skip`."""
+        if skip < 0 or not self.is_active(skip):
+            return self.first_fit(cpu, mem)
+        inf = float("inf")
+        slot = self.slot_of[skip]
+        self._update(slot, inf, inf)
+        vm_id = self.first_fit(cpu, mem)
+        self._update(slot, self.used_cpu[skip], self.used_mem[skip])
+        return vm_id
+
+    def max_free(self) -> Tuple[float, float]:
+        """Largest free cpu and largest free mem over the active VMs (not necessarily on one VM)."""
+        return 1.0 - self._min_cpu[1], 1.0 - self._min_mem[1]
+
+    def add(self, vm_id: int, cpu: float, mem: float) -> None:
+        self.used_cpu[vm_id] += cpu
+        self.used_mem[vm_id] += mem
+        self.n_tasks[vm_id] += 1
+        if self.n_tasks[vm_id] == 1:
+            self._drop_idle(vm_id)
+        self._update(self.slot_of[vm_id], self.used_cpu[vm_id], self.used_mem[vm_id])
+
+    def remove(self, vm_id: int, cpu: float, mem: float) -> None:
+        self.n_tasks[vm_id] -= 1
+        self.used_cpu[vm_id] -= cpu
+        self.used_mem[vm_id] -= mem
+        slot = self.slot_of[vm_id]
+        if slot < self.k:
+            self._update(slot, self.used_cpu[vm_id], self.used_mem[vm_id])
+            if self.n_tasks[vm_id] == 0:
+                self._push_idle(vm_id)
+
+    def _push_idle(self, vm_id: int) -> None:
+        if self._idle_pos[vm_id] < 0:
+            self._idle_pos[vm_id] = len(self.idle)
+            self.idle.append(vm_id)
+
+    def _drop_idle(self, vm_id: int) -> None:
+        pos = self._idle_pos[vm_id]
+        if pos >= 0:
+            last = self.idle.pop()
+            if last != vm_id:
+                self.idle[pos] = last
+                self._idle_pos[last] = pos
+            self._idle_pos[vm_id] = -1
+
+    def _update(self, slot: int, c: float, m: float) -> None:
+        mc, mm = self._min_cpu, self._min_mem
+        node = self._size + slot
+        mc[node] = c
+        mm[node] = m
+        node >>= 1
+        while node:
+            left = 2 * node
+            a, b = mc[left], mc[left + 1]
+            c = a if a < b else b
+            a, b = mm[left], mm[left + 1]
+            m = a if a < b else b
+            if mc[node] == c and mm[node] == m:
+                break
+            mc[node] = c
+            mm[node] = m
+            node >>= 1
+
+
 @dataclass
-class VM:
-    used_cpu: float = 0.0
-    used_mem: float = 0.0
+class Workload:
+    """
+    Struct-of-arrays workload: task j is
+    (arrival[j], runtime[j], cpu[j], mem[j]), sorted by arrival.
+    """
+
+    arrival: np.ndarray
+    runtime: np.ndarray
+    cpu: np.ndarray
+    mem: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.arrival.shape[0])
+
+    @classmethod
+    def from_tasks(cls, tasks: Sequence[Task]) -> "Workload":
+        return cls(
+            arrival=np.array([t.arrival for t in tasks], dtype=np.float64),
+            runtime=np.array([t.runtime for t in tasks], dtype=np.float64),
+            cpu=np.array([t.cpu for t in tasks], dtype=np.float64),
+            mem=np.array([t.mem for t in tasks], dtype=np.float64),
+        )
+
+    def work(self) -> np.ndarray:
+        # per-task max(cpu, mem) * runtime, same float ops as simulate's backlog
+        return np.maximum(self.cpu, self.mem) * self.runtime
+
+
+@dataclass
+class SimState:
+    """
+    Snapshot of a `simulate` run right after a control tick: everything
+    needed to continue it (possibly under a different policy) on the same
+    workload. Plain lists and numbers, so it pickles.
+
+    `simulate(stop_at=t)` stops after the first control tick at or past t
+    and returns the state under `state` (with `partial=True`); passing it
+    back as `resume` continues from there (same in-memory workload, same
+    metrics mode, any policy; `static_k` is ignored).
+    """
 
+    now: float
+    next_task: int
+    k: int
+    queue: List[int]
+    completions: List[Tuple[float, int, float, float]]
+    used_cpu: List[float]
+    used_mem: List[float]
+    backlog: float
+    n_started: int
+    n_viol60: int
+    vm_time: float
+    last_t: float
+    next_control: float
+    n_ticks: int
+    waits: List[float] = field(default_factory=list)
+    sketch: WaitSketch | None = None
+    ts: Dict[str, List] = field(default_factory=dict)
+    vm_at: List[int] = field(default_factory=list)  # VM id per slot (empty: identity)
 
-def dominant(task: Task) -> float:
-    return max(task.cpu, task.mem)
 
+WORKLOAD_COLUMNS = ["arrival_time_s", "runtime_s", "cpu_req", "mem_req"]
 
-def queued_work(queue: Deque[Task]) -> float:
-    # "resource-seconds" backlog approximation for MDP and scaling signals
-    return float(sum(dominant(t) * t.runtime for t in queue))
+# bump when a change alters simulate() results (invalidates cached runs)
+ENGINE_VERSION = "4"
 
+# control ticks between exact recomputations of the running backlog counter
+BACKLOG_RESYNC_TICKS = 60
+
+SCHEDULERS = ("fifo", "easy")
+
+# the backfill queue index buckets cpu and mem requests by power of two:
+# bin e holds [2**-(e+1), 2**-e), the last bin everything smaller
+BACKFILL_BUCKETS = 8
+
+
+def _request_bin(x: float) -> int:
+    e = -math.frexp(x)[1]  # x in [2**-(e+1), 2**-e)
+    return 0 if e < 0 else (e if e < BACKFILL_BUCKETS else BACKFILL_BUCKETS - 1)
+
+
+def _bin_floor(e: int) -> float:
+    return 0.0 if e == BACKFILL_BUCKETS - 1 else 2.0 ** -(e + 1)
+
+
+def _scalar_view(a: np.ndarray) -> memoryview:
+    # indexing yields plain Python floats without copying the array, so a
+    # shared-memory or memory-mapped workload stays shared
+    return memoryview(np.ascontiguousarray(a, dtype=np.float64))
+
+
+def _column_to_numpy(table, name: str) -> np.ndarray:
+    import pyarrow as pa
+
+    col = table.column(name)
+    if col.type != pa.float64():
+        col = col.cast(pa.float64())
+    # single-chunk float64 columns without nulls come back as a view
+    # over the Arrow buffer (no per-row conversion)
+    return col.to_numpy()
+
+
+# bump when the bundle layout or the preprocessing changes
+WORKLOAD_BUNDLE_VERSION = 1
+
+
+def _bundle_paths(path: str) -> Tuple[str, str]:
+    return path + ".workload.npy", path + ".workload.json"
+
+
+def _source_stamp(path: str) -> Dict:
+    st = os.stat(path)
+    return {
+        "version": WORKLOAD_BUNDLE_VERSION,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
 
-def make_workload_from_parquet(path: str) -> List[Task]:
-    import pandas as pd
 
-    df = pd.read_parquet(path).sort_values("arrival_time_s").reset_index(drop=True)
+def _load_bundle(path: str) -> Workload | None:
+    npy_path, meta_path = _bundle_paths(path)
+    try:
+        with open(meta_path) as f:
+            if json.load(f) != _source_stamp(path):
+                return None
+        block = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    return Workload(arrival=block[0], runtime=block[1], cpu=block[2], mem=block[3])
+
+
+def _write_bundle(path: str, w: Workload) -> None:
+    # one (4, n) float64 .npy: each row is a contiguous, 64-byte aligned column
+    npy_path, meta_path = _bundle_paths(path)
+    stamp = _source_stamp(path)
+    block = np.stack([w.arrival, w.runtime, w.cpu, w.mem])
+    if atomic_write(npy_path, lambda f: np.save(f, block), best_effort=True):
+        atomic_write(meta_path, lambda f: json.dump(stamp, f), mode="w", best_effort=True)
+
+
+def _read_parquet_workload(path: str) -> Workload:
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=WORKLOAD_COLUMNS)
+    arrival, runtime, cpu, mem = (_column_to_numpy(table, c) for c in WORKLOAD_COLUMNS)
+
+    # sliced workloads are already written in arrival order; only sort if not
+    if len(arrival) > 1 and not bool(np.all(arrival[1:] >= arrival[:-1])):
+        order = np.argsort(arrival, kind="stable")
+        arrival, runtime, cpu, mem = (a[order] for a in (arrival, runtime, cpu, mem))
 
     # shift time so simulation starts at 0
-    t0 = float(df["arrival_time_s"].iloc[0])
-    arrivals = (df["arrival_time_s"].astype(float) - t0).to_numpy()
-    runtimes = df["runtime_s"].astype(float).to_numpy()
-    cpu = df["cpu_req"].astype(float).to_numpy()
-    mem = df["mem_req"].astype(float).to_numpy()
+    t0 = float(arrival[0]) if len(arrival) else 0.0
+    return Workload(
+        arrival=arrival - t0,
+        runtime=np.ascontiguousarray(runtime),
+        cpu=np.ascontiguousarray(cpu),
+        mem=np.ascontiguousarray(mem),
+    )
+
 
-    tasks = [
-        Task(float(a), float(r), float(c), float(m))
-        for a, r, c, m in zip(arrivals, runtimes, cpu, mem)
-    ]
-    return tasks
+def make_workload_from_parquet(path: str, cache: bool = True) -> Workload:
+    """
+    Load a workload, sorted by arrival and shifted to start at 0.
+
+    With `cache`, the preprocessed arrays are written once to
+    `<path>.workload.npy` (plus a `.workload.json` stamp of the parquet's
+    size and mtime) and later loads memory-map that file, so concurrent
+    processes share its pages. A changed parquet invalidates the bundle.
+    """
+    if cache:
+        w = _load_bundle(path)
+        if w is not None:
+            return w
+    w = _read_parquet_workload(path)
+    if cache:
+        _write_bundle(path, w)
+    return w
+
+
+def iter_workload_chunks(path: str, batch_size: int = 1_000_000) -> Iterator[Workload]:
+    """
+    Stream a parquet workload that is already sorted by arrival as Workload
+    chunks of at most `batch_size` tasks, re-basing time on the fly so the
+    first arrival is at 0. Only one record batch is decoded at a time.
+
+    `simulate` pulls the next chunk only when it reaches it and drops the
+    data of tasks that have started, so its memory follows the tasks in
+    flight rather than the trace length (with `metrics="sketch"` the
+    waits are bounded too).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    t0: float | None = None
+    last = float("-inf")
+    for batch in pf.iter_batches(batch_size=batch_size, columns=WORKLOAD_COLUMNS):
+        if batch.num_rows == 0:
+            continue
+        table = pa.Table.from_batches([batch])
+        arrival, runtime, cpu, mem = (_column_to_numpy(table, c) for c in WORKLOAD_COLUMNS)
+        if arrival[0] < last or not bool(np.all(arrival[1:] >= arrival[:-1])):
+            raise ValueError(f"{path} is not sorted by arrival_time_s; cannot stream it.")
+        last = float(arrival[-1])
+        if t0 is None:
+            t0 = float(arrival[0])
+        yield Workload(arrival=arrival - t0, runtime=runtime, cpu=cpu, mem=mem)
 
 
 def simulate(
-    tasks: List[Task],
+    tasks: Workload | List[Task] | Iterable[Workload],
     policy_name: str,
     k_min: int,
     k_max: int,
@@ -58,41 +425,144 @@ def simulate(
     delta: int = 60,
     up_th: float = 3000.0,
     down_th: float = 500.0,
-    mdp_policy: Dict[Tuple[int, int], int] | None = None,
+    mdp_policy: Dict[Tuple[int, int], int] | CompiledPolicy | None = None,
     q_bins: np.ndarray | None = None,
     step_up: int = 50,
     step_down: int = 20,
+    scheduler: str = "fifo",
+    max_violations: int | None = None,
+    max_vm_seconds: float | None = None,
+    max_wall_s: float | None = None,
+    metrics: str = "exact",
+    stop_at: float | None = None,
+    resume: SimState | None = None,
 ) -> Dict:
     """
     Event-driven simulation with:
-    - FIFO queue
+    - FIFO queue, or EASY backfilling (`scheduler="easy"`, see `backfill`)
     - First-Fit placement across homogeneous VMs (cpu=1, mem=1)
-    - Scaling decisions every `delta` seconds
+    - Scaling decisions every `delta` seconds; scale-down releases idle VMs only
+
+    `tasks`: a Workload, a list of Task, or an iterator of chunks (`iter_workload_chunks`)
+    `mdp_policy`: the pickled dict (with `q_bins`) or a `CompiledPolicy`
+    `max_violations`, `max_vm_seconds`, `max_wall_s`: stop early with `partial=True`
+    `metrics`: "exact" waits, or "sketch" (`WaitSketch`, returned as `wait_sketch`)
+    `stop_at`, `resume`: snapshot a run into a `SimState` / continue one
     """
-    assert tasks, "No tasks provided."
+    chunks: Iterator[Workload] | None = None
+    if isinstance(tasks, list):
+        tasks = Workload.from_tasks(tasks)
+    elif not isinstance(tasks, Workload):
+        chunks = iter(tasks)
+        tasks = next((c for c in chunks if len(c)), Workload.from_tasks([]))
+    assert len(tasks), "No tasks provided."
+
+    # scalar access inside the event loop: memoryviews over the workload's
+    # arrays, or lists of the chunks in flight when streaming; task j lives
+    # at position j - base (base only moves when streaming)
+    columns = (tasks.arrival, tasks.runtime, tasks.cpu, tasks.mem)
+    if chunks is None:
+        arrival, runtime, cpu_req, mem_req = (_scalar_view(a) for a in columns)
+    else:
+        arrival, runtime, cpu_req, mem_req = (a.tolist() for a in columns)
+    base = 0
+
+    wall_t0 = time.perf_counter()
+
+    if resume is not None:
+        if chunks is not None:
+            raise ValueError("resume needs an in-memory Workload, not a stream.")
+        if (resume.sketch is not None) != (metrics == "sketch"):
+            raise ValueError("metrics mode must match the resumed state.")
+        resume = copy.deepcopy(resume)  # one snapshot can seed many runs
 
     # state
-    now = 0.0
-    i = 0  # next task index
-    n = len(tasks)
-
-    vms: List[VM] = [VM() for _ in range(static_k)]
-    k = static_k
-
-    queue: Deque[Task] = deque()
-    completions: List[Tuple[float, int, float, float]] = []
+    now = resume.now if resume else 0.0
+    i = resume.next_task if resume else 0  # next task index
+    n = len(arrival)  # tasks loaded so far
+
+    # k VMs are active; completion entries hold VM ids, which stay valid
+    # when scale-down moves VMs between slots (see ClusterState)
+    k = resume.k if resume else static_k
+    if resume:
+        cluster = ClusterState.restore(
+            max(len(resume.used_cpu), k_max),
+            k,
+            resume.used_cpu,
+            resume.used_mem,
+            resume.vm_at,
+            (c[1] for c in resume.completions),
+        )
+    else:
+        cluster = ClusterState(max(static_k, k_max), static_k)
+
+    queue: Deque[int] = deque(resume.queue if resume else ())  # task indices, FIFO
+    if scheduler not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler {scheduler}")
+    easy = scheduler == "easy"
+    # EASY backfilling: the queued tasks behind the head by request bucket,
+    # the backfilled tasks still in `queue` (dropped once they reach its
+    # front, so queue[0] is always the waiting head) and the head's
+    # reservation (head, k, shadow time, shadow VM, room left there)
+    n_buckets = BACKFILL_BUCKETS
+    buckets: List[Deque[int]] = [deque() for _ in range(n_buckets * n_buckets)]
+    bucket_lo = [(_bin_floor(b // n_buckets), _bin_floor(b % n_buckets)) for b in range(len(buckets))]
+    backfilled: set = set()
+    reservation: Tuple[int, int, float, int, float, float] | None = None
+    # a backfill pass that changes nothing is only repeated for buckets
+    # with a new oldest task, until room is freed or the head changes
+    freed = 0  # completions + scale-ups so far
+    last_pass: Tuple[int, int] | None = None  # (freed, head) of the last pass
+    fresh: set = set()  # buckets that were empty at their last arrival
+    backlog = resume.backlog if resume else 0.0  # running sum of work[j] over the queue
+    completions: List[Tuple[float, int, float, float]] = resume.completions if resume else []
     # heap items: (end_time, vm_id, cpu, mem)
 
     # metrics
-    waits: List[float] = []
-    vm_time = 0.0  # integral of k over time
-    last_t = 0.0
+    if metrics not in ("exact", "sketch"):
+        raise ValueError(f"Unknown metrics mode {metrics}")
+    waits: List[float] = resume.waits if resume else []
+    if resume:
+        sketch = resume.sketch
+    else:
+        sketch = WaitSketch() if metrics == "sketch" else None
+    record_wait = sketch.add if sketch is not None else waits.append
+    n_started = resume.n_started if resume else 0
+    n_viol60 = resume.n_viol60 if resume else 0
+    stop_reason: str | None = None
+    vm_time = resume.vm_time if resume else 0.0  # integral of k over time
+    last_t = resume.last_t if resume else 0.0
 
     # time series snapshots at control ticks
-    ts_t = []
-    ts_k = []
-    ts_q_tasks = []
-    ts_q_work = []
+    ts_t = resume.ts["t"] if resume else []
+    ts_k = resume.ts["k"] if resume else []
+    ts_q_tasks = resume.ts["q_tasks"] if resume else []
+    ts_q_work = resume.ts["q_work"] if resume else []
+    state: SimState | None = None
+
+    def refill() -> bool:
+        # pull the next non-empty chunk; False once the stream is exhausted
+        nonlocal chunks, base, n
+        while chunks is not None:
+            chunk = next(chunks, None)
+            if chunk is None:
+                chunks = None
+                break
+            if not len(chunk):
+                continue
+            # forget tasks that have already started
+            drop = (min(queue) if queue else i) - base
+            if drop > 0:
+                for col in (arrival, runtime, cpu_req, mem_req):
+                    del col[:drop]
+                base += drop
+            arrival.extend(chunk.arrival.tolist())
+            runtime.extend(chunk.runtime.tolist())
+            cpu_req.extend(chunk.cpu.tolist())
+            mem_req.extend(chunk.mem.tolist())
+            n += len(chunk)
+            return True
+        return False
 
     def integrate(to_t: float) -> None:
         nonlocal vm_time, last_t
@@ -101,60 +571,161 @@ def simulate(
             vm_time += k * dt
             last_t = to_t
 
+    def work(p: int) -> float:
+        # backlog contribution of the task at position p (Workload.work)
+        c, m = cpu_req[p], mem_req[p]
+        return (c if c >= m else m) * runtime[p]
+
+    def bucket(j: int) -> int:
+        return _request_bin(cpu_req[j - base]) * n_buckets + _request_bin(mem_req[j - base])
+
+    def start(j: int, vm_id: int) -> bool:
+        # start the task at position j on vm_id; False once a budget stops the run
+        # (max_violations: stop once more than that many waits exceed 60s;
+        # max_vm_seconds is checked per event, max_wall_s per control tick,
+        # and a stopped run's metrics cover the tasks started so far)
+        nonlocal backlog, n_started, n_viol60, stop_reason
+        cpu, mem = cpu_req[j], mem_req[j]
+        backlog -= work(j)
+        cluster.add(vm_id, cpu, mem)
+        end_t = now + runtime[j]
+        heapq.heappush(completions, (end_t, vm_id, cpu, mem))
+        w = now - arrival[j]
+        record_wait(w)
+        n_started += 1
+        if w > 60.0:
+            n_viol60 += 1
+            if max_violations is not None and n_viol60 > max_violations:
+                stop_reason = "max_violations"
+                return False
+        return True
+
+    def next_head() -> None:
+        # after the head started: skip backfilled tasks, take the new head out of its bucket
+        while queue and queue[0] in backfilled:
+            backfilled.discard(queue.popleft())
+        if queue:
+            buckets[bucket(queue[0])].popleft()
+
+    def reserve(head: int) -> Tuple[int, int, float, int, float, float]:
+        # replay the running tasks' completions until some VM has room for the head
+        cpu, mem = cpu_req[head - base], mem_req[head - base]
+        pending = list(completions)
+        freed_cpu: Dict[int, float] = {}
+        freed_mem: Dict[int, float] = {}
+        while pending:
+            end_t, vm_id, c, m = heapq.heappop(pending)
+            if not cluster.is_active(vm_id):
+                continue
+            freed_cpu[vm_id] = freed_cpu.get(vm_id, 0.0) + c
+            freed_mem[vm_id] = freed_mem.get(vm_id, 0.0) + m
+            used_c = cluster.used_cpu[vm_id] - freed_cpu[vm_id]
+            used_m = cluster.used_mem[vm_id] - freed_mem[vm_id]
+            if used_c + cpu <= 1.0 and used_m + mem <= 1.0:
+                return (head, cluster.k, end_t, vm_id, 1.0 - used_c - cpu, 1.0 - used_m - mem)
+        return (head, cluster.k, float("inf"), -1, 0.0, 0.0)
+
+    def backfill() -> None:
+        # EASY: a head that fits nowhere gets a reservation (shadow time and
+        # VM, see `reserve`); queued tasks behind it start out of order if
+        # they fit now and cannot delay it: another VM, ending before the
+        # shadow time, or within the room the head leaves on the shadow VM.
+        # Candidates come from the (cpu, mem) request buckets, oldest first;
+        # a bucket whose oldest task cannot start waits for the next event,
+        # so a deep backlog is never scanned task by task.
+        nonlocal reservation, last_pass
+        head = queue[0]
+        if reservation is None or reservation[:2] != (head, cluster.k) or reservation[2] <= now:
+            reservation = reserve(head)
+        _, _, shadow_t, shadow_vm, extra_cpu, extra_mem = reservation
+
+        free_cpu, free_mem = cluster.max_free()
+        tried = range(len(buckets)) if last_pass != (freed, head) else fresh
+        cand = [
+            (buckets[b][0], b)
+            for b in tried
+            if buckets[b] and bucket_lo[b][0] <= free_cpu and bucket_lo[b][1] <= free_mem
+        ]
+        fresh.clear()
+        last_pass = (freed, head)
+        heapq.heapify(cand)
+        while cand:
+            j, b = heapq.heappop(cand)
+            cpu, mem = cpu_req[j - base], mem_req[j - base]
+            vm_id = cluster.first_fit(cpu, mem)
+            if vm_id >= 0 and vm_id == shadow_vm and now + runtime[j - base] > shadow_t + 1e-9:
+                if cpu <= extra_cpu and mem <= extra_mem:
+                    extra_cpu -= cpu
+                    extra_mem -= mem
+                    reservation = (head, cluster.k, shadow_t, shadow_vm, extra_cpu, extra_mem)
+                else:
+                    vm_id = cluster.first_fit_except(cpu, mem, shadow_vm)
+            if vm_id < 0:
+                continue  # the bucket waits for the next event
+            buckets[b].popleft()
+            backfilled.add(j)
+            if not start(j - base, vm_id):
+                return
+            if buckets[b]:
+                heapq.heappush(cand, (buckets[b][0], b))
+
     def try_schedule() -> None:
-        nonlocal completions
         # FIFO: try to place the head; if it can't fit anywhere, stop
         while queue:
-            t = queue[0]
-            placed = False
-            for vm_id, vm in enumerate(vms[:k]):
-                if vm.used_cpu + t.cpu <= 1.0 and vm.used_mem + t.mem <= 1.0:
-                    queue.popleft()
-                    vm.used_cpu += t.cpu
-                    vm.used_mem += t.mem
-                    end_t = now + t.runtime
-                    heapq.heappush(completions, (end_t, vm_id, t.cpu, t.mem))
-                    waits.append(now - t.arrival)
-                    placed = True
-                    break
-            if not placed:
+            j = queue[0] - base
+            vm_id = cluster.first_fit(cpu_req[j], mem_req[j])
+            if vm_id < 0:
                 break
+            queue.popleft()
+            if easy:
+                next_head()
+            if not start(j, vm_id):
+                return
+        if easy and queue:
+            backfill()
 
     def scale_to(new_k: int) -> None:
-        nonlocal k, vms
+        nonlocal k, freed
         new_k = int(max(k_min, min(k_max, new_k)))
         if new_k == k:
             return
 
         if new_k > k:
-            for _ in range(new_k - k):
-                vms.append(VM())
+            freed += 1
+            # inactive VMs are idle (only idle VMs are ever deactivated)
             k = new_k
+            cluster.set_active(k)
             return
 
-        # Scale down by "deactivating" VMs from the end only if they are idle.
-        # We do NOT delete entries from `vms`, to keep completion vm_id indices valid.
-        while k > new_k:
-            vm = vms[k - 1]
-            if vm.used_cpu == 0 and vm.used_mem == 0:
-                k -= 1
-            else:
-                break
+        # Scale down by releasing idle VMs, whichever slots they are in;
+        # busy VMs stay until a later tick finds them idle
+        k -= cluster.release_idle(k - new_k)
+
+    if isinstance(mdp_policy, CompiledPolicy) and q_bins is None:
+        q_bins = mdp_policy.q_bins
+    q_edges = [float(x) for x in q_bins] if q_bins is not None else []
 
     def qbin(x: float) -> int:
-        assert q_bins is not None
-        n_q = len(q_bins) - 1
-        idx = int(np.digitize([x], q_bins)[0] - 1)
+        # same as np.digitize([x], q_bins)[0] - 1 without NumPy call overhead
+        n_q = len(q_edges) - 1
+        idx = bisect_right(q_edges, x) - 1
         if idx < 0:
             return 0
         if idx >= n_q:
             return n_q - 1
         return idx
 
-    next_control = 0.0
+    if easy:
+        for j in list(queue)[1:]:
+            buckets[bucket(j)].append(j)
+
+    next_control = resume.next_control if resume else 0.0
+    n_ticks = resume.n_ticks if resume else 0
 
     while True:
-        next_arrival = tasks[i].arrival if i < n else float("inf")
+        if i >= n and chunks is not None:
+            refill()
+        next_arrival = arrival[i - base] if i < n else float("inf")
         next_finish = completions[0][0] if completions else float("inf")
         next_event = min(next_arrival, next_finish, next_control)
 
@@ -163,27 +734,46 @@ def simulate(
 
         integrate(next_event)
         now = next_event
+        if max_vm_seconds is not None and vm_time > max_vm_seconds:
+            stop_reason = "max_vm_seconds"
+            break
 
         # process all finishes at this time
         while completions and completions[0][0] <= now + 1e-9:
             _, vm_id, cpu, mem = heapq.heappop(completions)
-            vms[vm_id].used_cpu -= cpu
-            vms[vm_id].used_mem -= mem
+            cluster.remove(vm_id, cpu, mem)
+            freed += 1
 
         # process all arrivals at this time
-        while i < n and tasks[i].arrival <= now + 1e-9:
-            queue.append(tasks[i])
+        while i < n or (chunks is not None and refill()):
+            if arrival[i - base] > now + 1e-9:
+                break
+            queue.append(i)
+            if easy and len(queue) > 1:
+                b = bucket(i)
+                if not buckets[b]:
+                    fresh.add(b)
+                buckets[b].append(i)
+            backlog += work(i - base)
             i += 1
 
         # schedule if possible
         try_schedule()
+        if stop_reason is not None:
+            break
 
         # control tick
         if abs(now - next_control) <= 1e-9:
-            qw = queued_work(queue)
+            # drift correction: exact on an empty queue and every few ticks
+            if not queue:
+                backlog = 0.0
+            elif n_ticks % BACKLOG_RESYNC_TICKS == 0:
+                backlog = float(sum(work(j - base) for j in queue if j not in backfilled))
+            n_ticks += 1
+            qw = backlog
             ts_t.append(now)
             ts_k.append(k)
-            ts_q_tasks.append(len(queue))
+            ts_q_tasks.append(len(queue) - len(backfilled))
             ts_q_work.append(qw)
 
             if policy_name == "static":
@@ -196,29 +786,78 @@ def simulate(
             elif policy_name == "mdp":
                 if mdp_policy is None or q_bins is None:
                     raise ValueError("mdp_policy and q_bins required for mdp.")
-                s = (k, qbin(qw))
-                a = mdp_policy.get(s, 0)  # default 'do nothing'
+                if isinstance(mdp_policy, CompiledPolicy):
+                    a = mdp_policy.action(k, qw)
+                else:
+                    s = (k, qbin(qw))
+                    a = mdp_policy.get(s, 0)  # default 'do nothing'
                 scale_to(k + a)
             else:
                 raise ValueError(f"Unknown policy {policy_name}")
 
             next_control += delta
 
+            if max_wall_s is not None and time.perf_counter() - wall_t0 > max_wall_s:
+                stop_reason = "max_wall_s"
+                break
+
+            if stop_at is not None and now >= stop_at:
+                stop_reason = "stop_at"
+                state = SimState(
+                    now=now,
+                    next_task=i,
+                    k=k,
+                    queue=[j for j in queue if j not in backfilled],
+                    completions=list(completions),
+                    used_cpu=list(cluster.used_cpu),
+                    used_mem=list(cluster.used_mem),
+                    vm_at=list(cluster.vm_at),
+                    backlog=backlog,
+                    n_started=n_started,
+                    n_viol60=n_viol60,
+                    vm_time=vm_time,
+                    last_t=last_t,
+                    next_control=next_control,
+                    n_ticks=n_ticks,
+                    waits=list(waits),
+                    sketch=copy.deepcopy(sketch),
+                    ts={
+                        "t": list(ts_t),
+                        "k": list(ts_k),
+                        "q_tasks": list(ts_q_tasks),
+                        "q_work": list(ts_q_work),
+                    },
+                )
+                break
+
         # stopping condition: all tasks arrived and queue empty and no running tasks
         if i >= n and not queue and not completions:
-            break
-
-    waits_arr = np.array(waits) if waits else np.array([0.0])
+            if chunks is None or not refill():
+                break
 
-    p95 = float(np.quantile(waits_arr, 0.95))
-    p99 = float(np.quantile(waits_arr, 0.99))
-    sla60 = float(np.mean(waits_arr > 60.0))
-    sla120 = float(np.mean(waits_arr > 120.0))
+    if sketch is not None:
+        mean_wait = sketch.mean()
+        p95 = sketch.quantile(0.95)
+        p99 = sketch.quantile(0.99)
+        sla60 = sketch.sla(60.0)
+        sla120 = sketch.sla(120.0)
+    else:
+        waits_arr = np.array(waits) if waits else np.array([0.0])
+
+        mean_wait = float(waits_arr.mean())
+        p95 = float(np.quantile(waits_arr, 0.95))
+        p99 = float(np.quantile(waits_arr, 0.99))
+        sla60 = float(np.mean(waits_arr > 60.0))
+        sla120 = float(np.mean(waits_arr > 120.0))
 
     return {
         "policy": policy_name,
         "tasks": n,
-        "mean_wait_s": float(waits_arr.mean()),
+        "partial": stop_reason is not None,
+        "stop_reason": stop_reason,
+        "tasks_started": n_started,
+        "sla60_violations": n_viol60,
+        "mean_wait_s": mean_wait,
         "p95_wait_s": p95,
         "p99_wait_s": p99,
         "sla60_violation": sla60,
@@ -230,4 +869,18 @@ def simulate(
             "q_tasks": ts_q_tasks,
             "q_work": ts_q_work,
         },
+        "wait_sketch": sketch,
+        "state": state,
     }
+
+
+def fork_simulations(
+    tasks: Workload,
+    state: SimState,
+    runs: Dict[str, Dict],
+) -> Dict[str, Dict]:
+    """
+    Continue one snapshot under several policies: `runs` maps a label to the
+    simulate() keyword arguments of that continuation.
+    """
+    return {label: simulate(tasks=tasks, resume=state, **kw) for label, kw in runs.items()}
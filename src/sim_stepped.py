@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from mdp_policy import CompiledPolicy, compile_policy
+from sim_engine import Task, Workload, make_workload_from_parquet, simulate
+
+# admitted batches up to this size are handled with plain Python floats
+SMALL_BATCH = 16
+
+
+def simulate_stepped(
+    tasks: Workload | List[Task],
+    policy_name: str,
+    k_min: int,
+    k_max: int,
+    static_k: int = 30,
+    delta: int = 60,
+    up_th: float = 3000.0,
+    down_th: float = 500.0,
+    mdp_policy: Dict[Tuple[int, int], int] | CompiledPolicy | None = None,
+    q_bins: np.ndarray | None = None,
+    step_up: int = 50,
+    step_down: int = 20,
+    dt: float = 10.0,
+    frag: float = 0.5,
+) -> Dict:
+    """
+    Approximate, time-stepped counterpart of `simulate` for screening runs.
+
+    Time advances in steps of `dt` seconds (`delta` must be a multiple).
+    At each step boundary the completions due are released, then the
+    longest FIFO prefix of the queue (including tasks arriving during the
+    step) whose total cpu and mem fit in the free capacity of the k active
+    VMs is started, all with prefix sums and `searchsorted`; nothing is
+    done per task in Python. Approximations against the exact engine:
+    - capacity is pooled instead of packed per VM with First-Fit.
+      Fragmentation is modelled by leaving `frag` times the mean request
+      unusable on every VM (0.5: the head task strands on average half a
+      task's worth of room per VM). Scale-down may go down to the pooled
+      usage instead of the number of VMs still running tasks;
+    - a queued task starts at the step boundary rather than at the exact
+      completion that frees room; completions are rounded to the nearest
+      boundary.
+    - an idle cluster always starts the queue head, even if it asks for
+      more than the pooled effective capacity (an empty VM fits it).
+    Returns the same keys as `simulate` (no budgets, streaming or resume).
+
+    Accuracy and speed depend on the trace; check with `error_report`. At
+    the default dt=10 the Google 2h slice ran 6-9x faster than `simulate`
+    (a synthetic 60k-task, 2h trace: 15-35x), and the error is largest
+    near the capacity knee: Google static k=22 gave a 106 s mean wait
+    against 535 s exact. Smaller `dt` narrows the gap at some speed.
+    """
+    if isinstance(tasks, list):
+        tasks = Workload.from_tasks(tasks)
+    assert len(tasks), "No tasks provided."
+    ticks_per_control = int(round(delta / dt))
+    if ticks_per_control < 1 or abs(ticks_per_control * dt - delta) > 1e-9:
+        raise ValueError("delta must be a multiple of dt.")
+
+    arrival = np.asarray(tasks.arrival, dtype=np.float64)
+    runtime = np.asarray(tasks.runtime, dtype=np.float64)
+    cpu = np.asarray(tasks.cpu, dtype=np.float64)
+    mem = np.asarray(tasks.mem, dtype=np.float64)
+    n = len(arrival)
+    # demand of tasks [a, b) is c_x[b] - c_x[a]; lists for fast scalar bisect
+    arrival_l: List[float] = arrival.tolist()
+    runtime_l: List[float] = runtime.tolist()
+    cpu_l: List[float] = cpu.tolist()
+    mem_l: List[float] = mem.tolist()
+    c_cpu: List[float] = np.concatenate(([0.0], np.cumsum(cpu))).tolist()
+    c_mem: List[float] = np.concatenate(([0.0], np.cumsum(mem))).tolist()
+    c_work: List[float] = np.concatenate(([0.0], np.cumsum(tasks.work()))).tolist()
+    # usable capacity per VM after fragmentation
+    eff_cpu = 1.0 - frag * float(cpu.mean())
+    eff_mem = 1.0 - frag * float(mem.mean())
+
+    # per-step release buckets (grown when a completion lands past the end)
+    n_buckets = int(math.ceil((arrival[-1] + runtime.max()) / dt)) + 2
+    rel_n = np.zeros(n_buckets, dtype=np.int64)
+    rel_cpu = np.zeros(n_buckets)
+    rel_mem = np.zeros(n_buckets)
+
+    if isinstance(mdp_policy, CompiledPolicy) and q_bins is None:
+        q_bins = mdp_policy.q_bins
+    if policy_name == "mdp":
+        if mdp_policy is None or q_bins is None:
+            raise ValueError("mdp_policy and q_bins required for mdp.")
+        if not isinstance(mdp_policy, CompiledPolicy):
+            # one dense table up front; ticks then use its bisect lookup
+            mdp_policy = compile_policy(mdp_policy, q_bins, k_min, k_max, delta)
+
+    k = static_k
+    head = 0  # next task to start; FIFO, so tasks start in index order
+    running = 0
+    used_cpu = used_mem = 0.0
+    vm_time = 0.0
+    wait_parts: List[np.ndarray] = []
+    waits_small: List[float] = []
+    ts_t: List[float] = []
+    ts_k: List[int] = []
+    ts_q_tasks: List[int] = []
+    ts_q_work: List[float] = []
+
+    def control(t: float, k: int, q_tasks: int, qw: float) -> int:
+        ts_t.append(t)
+        ts_k.append(k)
+        ts_q_tasks.append(q_tasks)
+        ts_q_work.append(qw)
+
+        if policy_name == "static":
+            new_k = k
+        elif policy_name == "threshold":
+            if qw > up_th:
+                new_k = k + step_up
+            elif qw < down_th:
+                new_k = k - step_down
+            else:
+                new_k = k
+        elif policy_name == "mdp":
+            new_k = k + mdp_policy.action(k, qw)
+        else:
+            raise ValueError(f"Unknown policy {policy_name}")
+
+        new_k = int(max(k_min, min(k_max, new_k)))
+        if new_k < k:
+            # only release capacity nothing is running on
+            busy = int(math.ceil(max(used_cpu / eff_cpu, used_mem / eff_mem) - 1e-9))
+            new_k = max(new_k, min(k, busy))
+        return new_k
+
+    s = 0
+    while True:
+        t = s * dt
+        if s < n_buckets and rel_n[s]:
+            running -= int(rel_n[s])
+            used_cpu -= float(rel_cpu[s])
+            used_mem -= float(rel_mem[s])
+            if running == 0:
+                used_cpu = used_mem = 0.0  # drop float drift
+        if head >= n and running == 0:
+            break
+
+        # start the longest queue prefix that fits in the pooled free capacity
+        arrived = bisect_left(arrival_l, t + dt)
+        if head < arrived:
+            j_cpu = bisect_right(c_cpu, c_cpu[head] + (k * eff_cpu - used_cpu) + 1e-12) - 1
+            j_mem = bisect_right(c_mem, c_mem[head] + (k * eff_mem - used_mem) + 1e-12) - 1
+            j = min(j_cpu, j_mem, arrived)
+            if j == head and running == 0:
+                # an empty VM always fits one task (requests are <= 1), even
+                # when it asks for more than the pooled effective capacity
+                j = head + 1
+            if j > head:
+                # completions land on the nearest later step boundary
+                if j - head <= SMALL_BATCH:
+                    # sparse traces: a few tasks per step are cheaper without NumPy
+                    idx = range(head, j)
+                    starts = [arrival_l[x] if arrival_l[x] > t else t for x in idx]
+                    waits_small.extend(st - arrival_l[x] for st, x in zip(starts, idx))
+                    bucket = [max(round((st + runtime_l[x]) / dt), s + 1) for st, x in zip(starts, idx)]
+                    top = max(bucket)
+                else:
+                    start = np.maximum(arrival[head:j], t)
+                    wait_parts.append(start - arrival[head:j])
+                    bucket = np.maximum(np.rint((start + runtime[head:j]) / dt).astype(np.int64), s + 1)
+                    top = int(bucket.max())
+                if top >= n_buckets:
+                    grow = max(top + 1, 2 * n_buckets) - n_buckets
+                    rel_n = np.concatenate((rel_n, np.zeros(grow, dtype=np.int64)))
+                    rel_cpu = np.concatenate((rel_cpu, np.zeros(grow)))
+                    rel_mem = np.concatenate((rel_mem, np.zeros(grow)))
+                    n_buckets += grow
+                if isinstance(bucket, list):
+                    for b, x in zip(bucket, idx):
+                        rel_n[b] += 1
+                        rel_cpu[b] += cpu_l[x]
+                        rel_mem[b] += mem_l[x]
+                else:
+                    lo = s + 1
+                    span = top + 1 - lo
+                    bucket -= lo
+                    rel_n[lo : lo + span] += np.bincount(bucket, minlength=span)
+                    rel_cpu[lo : lo + span] += np.bincount(bucket, weights=cpu[head:j], minlength=span)
+                    rel_mem[lo : lo + span] += np.bincount(bucket, weights=mem[head:j], minlength=span)
+                running += j - head
+                used_cpu += c_cpu[j] - c_cpu[head]
+                used_mem += c_mem[j] - c_mem[head]
+                head = j
+
+        # control tick
+        if s % ticks_per_control == 0:
+            queued_to = max(head, bisect_right(arrival_l, t))
+            k = control(t, k, queued_to - head, c_work[queued_to] - c_work[head])
+
+        # skip steps where nothing can happen: the next control tick, the
+        # next completion, or (with an empty queue) the next arrival
+        nxt = (s // ticks_per_control + 1) * ticks_per_control
+        if head >= arrived and arrived < n:
+            next_arrival = int(arrival_l[arrived] // dt)
+            if running == 0:
+                # idle cluster: only control ticks until the next arrival
+                while nxt < next_arrival:
+                    vm_time += k * (nxt - s) * dt
+                    s = nxt
+                    k = control(s * dt, k, 0, 0.0)
+                    nxt += ticks_per_control
+            nxt = min(nxt, next_arrival)
+        window = rel_n[s + 1 : nxt]
+        if len(window):
+            first = int((window != 0).argmax())
+            if window[first]:
+                nxt = s + 1 + first
+        vm_time += k * (nxt - s) * dt
+        s = nxt
+
+    wait_parts.append(np.array(waits_small))
+    waits = np.concatenate(wait_parts) if n else np.array([0.0])
+    n_viol60 = int(np.count_nonzero(waits > 60.0))
+    return {
+        "policy": policy_name,
+        "tasks": n,
+        "partial": False,
+        "stop_reason": None,
+        "tasks_started": n,
+        "sla60_violations": n_viol60,
+        "mean_wait_s": float(waits.mean()),
+        "p95_wait_s": float(np.quantile(waits, 0.95)),
+        "p99_wait_s": float(np.quantile(waits, 0.99)),
+        "sla60_violation": n_viol60 / len(waits),
+        "sla120_violation": float(np.mean(waits > 120.0)),
+        "vm_seconds": float(vm_time),
+        "ts": {
+            "t": ts_t,
+            "k": ts_k,
+            "q_tasks": ts_q_tasks,
+            "q_work": ts_q_work,
+        },
+        "wait_sketch": None,
+        "state": None,
+    }
+
+
+ERROR_KEYS = ["mean_wait_s", "p95_wait_s", "p99_wait_s", "sla60_violation", "sla120_violation", "vm_seconds"]
+
+
+def error_report(jobs: List[Dict], dt: float) -> List[Dict]:
+    """Run each experiment-matrix job with both engines and compare."""
+    workloads: Dict[str, Workload] = {}
+    policies: Dict[str, CompiledPolicy] = {}
+    rows = []
+    for job in jobs:
+        path = job["workload"]
+        if path not in workloads:
+            workloads[path] = make_workload_from_parquet(path)
+        kwargs = dict(job["params"])
+        if kwargs.pop("scheduler", "fifo") != "fifo":
+            continue  # the stepped engine only models the FIFO queue
+        if job["policy"] == "mdp":
+            if job["mdp_policy"] not in policies:
+                policies[job["mdp_policy"]] = CompiledPolicy.load(job["mdp_policy"])
+            kwargs["mdp_policy"] = policies[job["mdp_policy"]]
+
+        t = time.perf_counter()
+        exact = simulate(tasks=workloads[path], policy_name=job["policy"], **kwargs)
+        t_exact = time.perf_counter() - t
+        t = time.perf_counter()
+        approx = simulate_stepped(tasks=workloads[path], policy_name=job["policy"], dt=dt, **kwargs)
+        t_stepped = time.perf_counter() - t
+
+        row = {"dataset": job["dataset"], "policy": job["policy"], "static_k": kwargs["static_k"]}
+        for key in ERROR_KEYS:
+            row[key] = exact[key]
+            row[key + "_stepped"] = approx[key]
+        row["vm_seconds_rel_err"] = abs(approx["vm_seconds"] - exact["vm_seconds"]) / max(exact["vm_seconds"], 1e-9)
+        row["exact_s"] = t_exact
+        row["stepped_s"] = t_stepped
+        row["speedup"] = t_exact / max(t_stepped, 1e-9)
+        rows.append(row)
+    return rows
+
+
+def main():
+    from experiment_matrix import expand_jobs
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--matrix", default="experiments.json")
+    p.add_argument("--only", nargs="*", default=None, help="dataset names to run")
+    p.add_argument("--dt", type=float, default=10.0)
+    p.add_argument("--out", default="results/stepped_error.json")
+    args = p.parse_args()
+
+    with open(args.matrix) as f:
+        jobs = expand_jobs(json.load(f), only=args.only)
+    rows = error_report(jobs, args.dt)
+    with open(args.out, "w") as f:
+        json.dump(rows, f, indent=2)
+
+    print(f"{'dataset':8} {'policy':9} {'k':>5} {'sla60 exact/stepped':>22} {'mean wait exact/stepped':>26} {'vm_s err':>8} {'speedup':>8}")
+    for r in rows:
+        print(
+            f"{r['dataset']:8} {r['policy']:9} {r['static_k']:5d} "
+            f"{r['sla60_violation']:10.4f} /{r['sla60_violation_stepped']:10.4f} "
+            f"{r['mean_wait_s']:12.2f} /{r['mean_wait_s_stepped']:12.2f} "
+            f"{r['vm_seconds_rel_err']:8.2%} {r['speedup']:7.1f}x"
+        )
+    print("Wrote:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from mdp_policy import CompiledPolicy
+from sim_engine import Workload, make_workload_from_parquet
+
+
+def arrivals_work_series(workload: Workload, delta: int = 60, until_done: bool = False) -> np.ndarray:
+    """
+    Arrival work (max(cpu, mem) * runtime, resource-seconds) per `delta`
+    interval, in time order and including empty intervals; the series the
+    aggregated MDP of train_mdp.py is built on. With `until_done` it is
+    zero-padded up to the last task completion, the horizon `simulate`
+    charges VM-seconds over.
+    """
+    idx = np.floor((workload.arrival - workload.arrival[0]) / delta).astype(np.int64)
+    n = _n_intervals(workload, delta) if until_done else 0
+    return np.bincount(idx, weights=workload.work(), minlength=n)
+
+
+def occupancy_series(workload: Workload, delta: int = 60) -> np.ndarray:
+    """
+    Mean occupancy in VMs' worth (the larger of total cpu and total mem in
+    use) per `delta` interval up to the last completion, if every task
+    started on arrival: the capacity the running tasks pin, under which
+    no policy can scale down.
+    """
+    start = workload.arrival - workload.arrival[0]
+    end = start + workload.runtime
+    edges = np.arange(_n_intervals(workload, delta) + 1) * float(delta)
+
+    def clipped(x: np.ndarray, size: np.ndarray) -> np.ndarray:
+        # sum_j size_j * min(e, x_j) at every edge e
+        order = np.argsort(x, kind="stable")
+        xs, ws = x[order], size[order]
+        below = np.concatenate(([0.0], np.cumsum(ws * xs)))
+        mass = np.concatenate(([0.0], np.cumsum(ws)))
+        i = np.searchsorted(xs, edges, side="right")
+        return below[i] + edges * (mass[-1] - mass[i])
+
+    # integral of occupancy over [0, e], per resource
+    busy_cpu = clipped(end, workload.cpu) - clipped(start, workload.cpu)
+    busy_mem = clipped(end, workload.mem) - clipped(start, workload.mem)
+    return np.maximum(np.diff(busy_cpu), np.diff(busy_mem)) / delta
+
+
+def _n_intervals(workload: Workload, delta: int) -> int:
+    span = float((workload.arrival + workload.runtime).max() - workload.arrival[0])
+    return int(np.floor(span / delta)) + 1
+
+
+# ---------------------------------------------------------------------------
+# Erlang-C / M/G/c estimates for static capacity
+
+
+def _erlang_c(a: np.ndarray, c_max: int) -> np.ndarray:
+    """
+    Erlang-C waiting probability C(c, a) for c = 0..c_max (rows) and every
+    offered load in `a` (columns), via the stable Erlang-B recursion
+    B(c) = a B(c-1) / (c + a B(c-1)). Entries with a >= c are 1.
+    """
+    out = np.ones((c_max + 1, len(a)))
+    b = np.ones(len(a))
+    for c in range(1, c_max + 1):
+        b = a * b / (c + a * b)
+        rho = a / c
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cc = b / (1.0 - rho * (1.0 - b))
+        out[c] = np.where(rho < 1.0, cc, 1.0)
+    return out
+
+
+def erlang_static(
+    workload: Workload,
+    ks: Sequence[int],
+    period_s: float = 600.0,
+    thresholds: Sequence[float] = (60.0, 120.0),
+) -> List[Dict]:
+    """
+    M/G/c estimates of the static policy for every k in `ks`.
+
+    A busy task takes a `slot` of its VM: the runtime-weighted mean request
+    of the bottleneck resource (cpu or mem, whichever carries more load),
+    so k VMs are c = floor(k / slot) servers with the mean runtime as
+    service time and the offered load in VMs matches the trace. The arrival rate is taken per `period_s` window (stationary
+    independent period-by-period approximation, so the busy periods of the
+    trace count), and within a window
+        P(W > t) = C(c, a) * exp(-(c mu - lambda) t / m),
+    with Erlang-C C(c, a) and the M/G/c correction m = (1 + cs^2) / 2 on the
+    conditional wait (cs: coefficient of variation of runtimes). Waits are
+    averaged over windows weighted by their arrivals.
+    """
+    runtime = np.asarray(workload.runtime, dtype=float)
+    mean_s = float(runtime.mean())
+    # bottleneck share of a VM per busy task: lambda * E[S] * slot is the load in VMs
+    slot = max(float(np.dot(workload.cpu, runtime)), float(np.dot(workload.mem, runtime))) / float(runtime.sum())
+    cs2 = float(runtime.var() / mean_s**2) if mean_s > 0 else 0.0
+    corr = (1.0 + cs2) / 2.0
+    horizon = float((workload.arrival + workload.runtime).max() - workload.arrival[0])
+
+    idx = np.floor((workload.arrival - workload.arrival[0]) / period_s).astype(np.int64)
+    counts = np.bincount(idx).astype(float)
+    lam = counts / period_s  # arrivals per second, per window
+    a = lam * mean_s  # offered load in busy task slots
+    weight = counts / counts.sum()
+
+    ks = [int(k) for k in ks]
+    cs = np.array([int(k / slot) for k in ks])
+    C = _erlang_c(a, int(cs.max()))
+
+    rows = []
+    for k, c in zip(ks, cs):
+        p_wait = C[c]
+        stable = a < c
+        rate = np.where(stable, (c / mean_s - lam) / corr, 0.0)  # decay of P(W > t | wait)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_wait = np.where(stable, p_wait / rate, np.inf)
+        row = {
+            "static_k": k,
+            "servers": int(c),
+            "utilization": float(np.dot(weight, np.minimum(a / max(c, 1), 1.0))),
+            "p_wait": float(np.dot(weight, p_wait)),
+            "mean_wait_s": float(np.dot(weight, mean_wait)) if stable.all() else float("inf"),
+            "vm_seconds": k * horizon,
+        }
+        for t in thresholds:
+            p_over = np.where(stable, p_wait * np.exp(-rate * t), 1.0)
+            row[f"sla{int(t)}_violation"] = float(np.dot(weight, p_over))
+        rows.append(row)
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Vectorized fluid-backlog rollouts
+
+
+def fluid_rollout(
+    arrivals_work: np.ndarray,
+    k0: np.ndarray,
+    decide: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    k_min: int,
+    k_max: int,
+    delta: int = 60,
+    floor: np.ndarray | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Roll the aggregated model of train_mdp.py forward for P policies at once:
+    at each control tick the policies see (k, q) and pick k' = decide(k, q)
+    (clipped to [k_min, k_max], and to at least `floor[t]` VMs if given);
+    the backlog then moves as
+        q' = max(0, q + w_in - k' * delta).
+    Returns per-policy arrays: `vm_seconds`, `mean_q`, `max_q`, and
+    `sla60_proxy` / `sla120_proxy`, the share of arrival work that arrives
+    while the backlog would take more than 60 / 120 s to drain (q / k).
+    """
+    w = np.asarray(arrivals_work, dtype=float)
+    k = np.asarray(k0, dtype=np.int64).copy()
+    q = np.zeros(len(k))
+    vm_seconds = np.zeros(len(k))
+    q_sum = np.zeros(len(k))
+    q_max = np.zeros(len(k))
+    over60 = np.zeros(len(k))
+    over120 = np.zeros(len(k))
+    lo = np.full(len(w), k_min) if floor is None else np.clip(np.ceil(floor - 1e-9), k_min, k_max).astype(np.int64)
+    for w_in, k_lo in zip(w, lo):
+        k = np.clip(decide(k, q), k_lo, k_max)
+        drain = q / k
+        over60 += w_in * (drain > 60.0)
+        over120 += w_in * (drain > 120.0)
+        q = np.maximum(0.0, q + w_in - k * delta)
+        vm_seconds += k * delta
+        q_sum += q
+        np.maximum(q_max, q, out=q_max)
+    total = max(float(w.sum()), 1e-12)
+    return {
+        "vm_seconds": vm_seconds,
+        "mean_q": q_sum / max(len(w), 1),
+        "max_q": q_max,
+        "sla60_proxy": over60 / total,
+        "sla120_proxy": over120 / total,
+    }
+
+
+def fluid_threshold(
+    arrivals_work: np.ndarray,
+    k_min: int,
+    k_max: int,
+    up_th: np.ndarray,
+    down_th: np.ndarray,
+    step_up: np.ndarray,
+    step_down: np.ndarray,
+    k0: int | None = None,
+    delta: int = 60,
+    floor: np.ndarray | None = None,
+) -> Dict[str, np.ndarray]:
+    """Fluid rollout of the threshold policy for aligned parameter arrays."""
+    up_th, down_th, step_up, step_down = np.broadcast_arrays(
+        np.asarray(up_th, dtype=float),
+        np.asarray(down_th, dtype=float),
+        np.asarray(step_up, dtype=np.int64),
+        np.asarray(step_down, dtype=np.int64),
+    )
+
+    def decide(k: np.ndarray, q: np.ndarray) -> np.ndarray:
+        return np.where(q > up_th, k + step_up, np.where(q < down_th, k - step_down, k))
+
+    start = np.full(len(up_th), k_min if k0 is None else k0)
+    return fluid_rollout(arrivals_work, start, decide, k_min, k_max, delta, floor)
+
+
+def fluid_mdp(
+    arrivals_work: np.ndarray,
+    policies: Sequence[CompiledPolicy],
+    k0: int | None = None,
+    floor: np.ndarray | None = None,
+) -> Dict[str, np.ndarray]:
+    """Fluid rollout of compiled MDP policies (same k range, delta and q_bins)."""
+    first = policies[0]
+    for pol in policies[1:]:
+        if (pol.k_min, pol.k_max, pol.delta) != (first.k_min, first.k_max, first.delta) or not np.array_equal(
+            pol.q_bins, first.q_bins
+        ):
+            raise ValueError("All policies must share k_min, k_max, delta and q_bins.")
+    tables = np.stack([np.asarray(pol.table) for pol in policies])  # (P, k, q_bin), rows by absolute k
+    q_edges = np.asarray(first.q_bins, dtype=float)
+    n_q = len(q_edges) - 1
+    rows = np.arange(len(policies))
+
+    def decide(k: np.ndarray, q: np.ndarray) -> np.ndarray:
+        qb = np.clip(np.searchsorted(q_edges, q, side="right") - 1, 0, n_q - 1)
+        return k + tables[rows, k, qb]
+
+    start = np.full(len(policies), first.k_min if k0 is None else k0)
+    return fluid_rollout(arrivals_work, start, decide, first.k_min, first.k_max, first.delta, floor)
+
+
+def threshold_grid(
+    up_th: Sequence[float],
+    down_th: Sequence[float],
+    step_up: Sequence[int],
+    step_down: Sequence[int],
+) -> Dict[str, np.ndarray]:
+    """All combinations with down_th < up_th, as aligned arrays."""
+    combos = [c for c in itertools.product(up_th, down_th, step_up, step_down) if c[1] < c[0]]
+    cols = np.array(combos, dtype=float).T if combos else np.zeros((4, 0))
+    return {
+        "up_th": cols[0],
+        "down_th": cols[1],
+        "step_up": cols[2].astype(np.int64),
+        "step_down": cols[3].astype(np.int64),
+    }
+
+
+def main():
+    from sim_cache import ResultCache
+
+    p = argparse.ArgumentParser()
+    p.add_argument("--workload", default="data/processed/google_tasks_2h.parquet")
+    p.add_argument("--mdp", default="results/mdp_policy.npz", help="for k_min/k_max/delta and the mdp run")
+    p.add_argument("--sla60", type=float, default=0.05, help="target P(wait > 60s)")
+    p.add_argument("--top", type=int, default=5, help="threshold candidates sent to the simulator")
+    p.add_argument("--out", default="results/surrogate_screen.json")
+    args = p.parse_args()
+
+    workload = make_workload_from_parquet(args.workload)
+    mdp = CompiledPolicy.load(args.mdp)
+    k_min, k_max, delta = mdp.k_min, mdp.k_max, mdp.delta
+    aw = arrivals_work_series(workload, delta, until_done=True)
+    occ = occupancy_series(workload, delta)
+    cache = ResultCache()
+    common = dict(k_min=k_min, k_max=k_max, delta=delta)
+
+    # static: Erlang estimate for every k, simulate only the predicted boundary
+    est = erlang_static(workload, range(max(1, k_min), k_max + 1))
+    ok = [r for r in est if r["sla60_violation"] <= args.sla60]
+    k_pred = ok[0]["static_k"] if ok else k_max
+    static_checks = []
+    for k in sorted({max(k_min, k_pred - 1), k_pred, min(k_max, k_pred + 1)}):
+        r = cache.simulate(tasks=workload, policy_name="static", static_k=k, **common)
+        static_checks.append({"static_k": k, "sla60_violation": r["sla60_violation"], "vm_seconds": r["vm_seconds"]})
+
+    # threshold: fluid-screen the grid, simulate the cheapest feasible few
+    grid = threshold_grid(
+        up_th=np.geomspace(100.0, 1e5, 16),
+        down_th=np.geomspace(10.0, 1e4, 16),
+        step_up=[5, 10, 20, 50, 100],
+        step_down=[1, 5, 10, 20, 50],
+    )
+    fl = fluid_threshold(aw, k_min, k_max, delta=delta, floor=occ, **grid)
+    feasible = np.flatnonzero(fl["sla60_proxy"] <= args.sla60)
+    order = feasible[np.argsort(fl["vm_seconds"][feasible], kind="stable")][: args.top]
+    threshold_checks = []
+    for i in order:
+        params = {name: grid[name][i].item() for name in grid}
+        r = cache.simulate(tasks=workload, policy_name="threshold", static_k=k_min, **params, **common)
+        threshold_checks.append(
+            dict(
+                params,
+                fluid_sla60=float(fl["sla60_proxy"][i]),
+                fluid_vm_seconds=float(fl["vm_seconds"][i]),
+                sla60_violation=r["sla60_violation"],
+                vm_seconds=r["vm_seconds"],
+            )
+        )
+
+    fm = fluid_mdp(aw, [mdp], floor=occ)
+    r = cache.simulate(tasks=workload, policy_name="mdp", static_k=k_min, mdp_policy=mdp, q_bins=mdp.q_bins, **common)
+    mdp_check = {
+        "fluid_sla60": float(fm["sla60_proxy"][0]),
+        "fluid_vm_seconds": float(fm["vm_seconds"][0]),
+        "sla60_violation": r["sla60_violation"],
+        "vm_seconds": r["vm_seconds"],
+    }
+
+    print("Erlang-C smallest static_k with sla60 <=", args.sla60, ":", k_pred)
+    for row in static_checks:
+        print("  simulated:", row)
+    print(f"Threshold grid: {len(grid['up_th'])} combinations, {len(feasible)} pass the fluid screen")
+    for row in threshold_checks:
+        print("  simulated:", row)
+    print("MDP:", mdp_check)
+
+    with open(args.out, "w") as f:
+        json.dump(
+            {
+                "sla60": args.sla60,
+                "erlang_static_k": k_pred,
+                "erlang_curve": est,
+                "static_checks": static_checks,
+                "threshold_checks": threshold_checks,
+                "mdp_check": mdp_check,
+            },
+            f,
+            indent=2,
+        )
+    print("Wrote:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+import os
+from multiprocessing import get_context, shared_memory
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from fsutil import atomic_write
+from sim_cache import ResultCache, params_key, workload_fingerprint
+from sim_engine import Workload, simulate
+
+# order of the workload arrays inside the shared-memory block
+_FIELDS = ("arrival", "runtime", "cpu", "mem")
+
+# per-worker state, set by _init_worker
+_shm: shared_memory.SharedMemory | None = None
+_workload: Workload | None = None
+
+
+def share_workload(workload: Workload) -> shared_memory.SharedMemory:
+    """Copy the workload arrays once into a shared-memory block."""
+    n = len(workload)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(_FIELDS) * n * 8))
+    block = np.ndarray((len(_FIELDS), n), dtype=np.float64, buffer=shm.buf)
+    for row, name in enumerate(_FIELDS):
+        block[row] = getattr(workload, name)
+    del block
+    return shm
+
+
+def attach_workload(shm: shared_memory.SharedMemory, n: int) -> Workload:
+    """Zero-copy Workload view over a block written by `share_workload`."""
+    block = np.ndarray((len(_FIELDS), n), dtype=np.float64, buffer=shm.buf)
+    return Workload(**{name: block[row] for row, name in enumerate(_FIELDS)})
+
+
+def _init_worker(shm_name: str, n: int) -> None:
+    global _shm, _workload
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _workload = attach_workload(_shm, n)
+
+
+def _run_one(job: Tuple[int, Dict]) -> Tuple[int, Dict]:
+    k, sim_kwargs = job
+    assert _workload is not None
+    r = simulate(tasks=_workload, policy_name="static", static_k=k, **sim_kwargs)
+    r.pop("ts", None)  # time series are not needed for sweeps
+    return k, r
+
+
+def _write_rows(rows: List[Dict], out_path: str) -> None:
+    atomic_write(out_path, lambda f: json.dump(rows, f, indent=2), mode="w")
+
+
+def run_sweep(
+    workload: Workload,
+    ks: Sequence[int],
+    row_fn: Callable[[int, Dict], Dict],
+    out_path: str | None = None,
+    workers: int | None = None,
+    cache: ResultCache | None = None,
+    **sim_kwargs,
+) -> List[Dict]:
+    """
+    Simulate the static policy for every k in `ks` on a process pool.
+
+    The workload is published once through shared memory and every worker
+    maps it without copying. `row_fn(k, result)` turns a simulate() result
+    into a JSON row; rows are kept sorted by k and, if `out_path` is given,
+    the file is rewritten as each run finishes. With a `cache`, k values
+    already simulated are served from it and only the misses are run.
+    """
+    ks = [int(k) for k in ks]
+    rows: Dict[int, Dict] = {}
+    keys: Dict[int, str] = {}
+
+    def collect(k: int, r: Dict) -> None:
+        if cache is not None and k in keys:
+            cache.put(keys[k], r)
+        rows[k] = row_fn(k, r)
+        if out_path is not None:
+            _write_rows([rows[kk] for kk in sorted(rows)], out_path)
+
+    if cache is not None:
+        wkey = workload_fingerprint(workload)
+        todo = []
+        for k in ks:
+            key = params_key(wkey, dict(sim_kwargs, policy_name="static", static_k=k))
+            hit = cache.get(key)
+            if hit is not None:
+                collect(k, hit)
+            else:
+                keys[k] = key
+                todo.append(k)
+        ks = todo
+        if not ks:
+            return [rows[k] for k in sorted(rows)]
+
+    workers = min(workers or os.cpu_count() or 1, len(ks))
+
+    if workers <= 1:
+        for k in ks:
+            r = simulate(tasks=workload, policy_name="static", static_k=k, **sim_kwargs)
+            collect(k, r)
+        return [rows[k] for k in sorted(rows)]
+
+    shm = share_workload(workload)
+    try:
+        ctx = get_context()
+        with ctx.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(shm.name, len(workload)),
+        ) as pool:
+            jobs = [(k, sim_kwargs) for k in ks]
+            for k, r in pool.imap_unordered(_run_one, jobs):
+                collect(k, r)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return [rows[k] for k in sorted(rows)]
+
+
+def _max_violations(sla60: float, n: int) -> int:
+    # largest count v with v / n <= sla60, using the same division as simulate
+    v = int(sla60 * n)
+    while (v + 1) / n <= sla60:
+        v += 1
+    while v > 0 and v / n > sla60:
+        v -= 1
+    return v
+
+
+def search_static_k(
+    workload: Workload,
+    sla60: float,
+    k_lo: int,
+    k_hi: int,
+    curve_radius: int = 2,
+    **sim_kwargs,
+) -> Dict:
+    """
+    Smallest static_k in [k_lo, k_hi] with sla60_violation <= `sla60`.
+
+    SLA violation is monotone non-increasing in k for FIFO First-Fit on a
+    fixed trace, so the boundary is found by galloping up from `k_lo` and
+    then bisecting, in O(log(k_hi - k_lo)) simulations. Probe runs stop as
+    soon as they exceed the violation budget (or a `max_violations` passed
+    in `sim_kwargs`, whichever is lower). The full (unbudgeted) results for
+    k* +- `curve_radius` are returned as the cost curve; probes that ran to
+    completion are reused there.
+    """
+    if k_lo > k_hi:
+        raise ValueError("k_lo must be <= k_hi")
+    sim_kwargs = dict(sim_kwargs)
+    user_budget = sim_kwargs.pop("max_violations", None)
+    budget = _max_violations(sla60, len(workload))
+    if user_budget is not None:
+        budget = min(budget, int(user_budget))
+    probes: Dict[int, bool] = {}
+    # probe results that were not stopped early, same as an unbudgeted run
+    complete: Dict[int, Dict] = {}
+
+    def feasible(k: int) -> bool:
+        if k not in probes:
+            r = simulate(
+                tasks=workload,
+                policy_name="static",
+                static_k=k,
+                max_violations=budget,
+                **sim_kwargs,
+            )
+            if not r["partial"]:
+                complete[k] = r
+            probes[k] = not r["partial"] and r["sla60_violation"] <= sla60
+        return probes[k]
+
+    # gallop: k_lo, k_lo+1, k_lo+3, k_lo+7, ... until feasible
+    bad, step, k = k_lo - 1, 1, k_lo
+    while not feasible(k):
+        bad = k
+        if k == k_hi:
+            return {"static_k": None, "sla60": sla60, "simulations": len(probes), "curve": []}
+        k = min(k_hi, k + step)
+        step *= 2
+    good = k
+
+    # bisect (bad, good]
+    while good - bad > 1:
+        mid = (bad + good) // 2
+        if feasible(mid):
+            good = mid
+        else:
+            bad = mid
+
+    curve = []
+    n_curve_sims = 0
+    for kk in range(max(k_lo, good - curve_radius), min(k_hi, good + curve_radius) + 1):
+        r = complete.get(kk)
+        if r is None:
+            r = simulate(
+                tasks=workload,
+                policy_name="static",
+                static_k=kk,
+                max_violations=user_budget,
+                **sim_kwargs,
+            )
+            n_curve_sims += 1
+        r.pop("ts", None)
+        r["static_k"] = kk
+        curve.append(r)
+
+    return {
+        "static_k": good,
+        "sla60": sla60,
+        "simulations": len(probes) + n_curve_sims,
+        "curve": curve,
+    }
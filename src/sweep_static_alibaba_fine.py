@@ -3,7 +3,9 @@ import pickle
 import sys
 
 sys.path.append("src")
-from sim_engine import make_workload_from_parquet, simulate
+from sim_engine import make_workload_from_parquet
+from sim_cache import ResultCache
+from sweep_engine import run_sweep
 
 
 def main():
@@ -17,25 +19,22 @@ def main():
 
     ks = list(range(max(1, k_min), 13))  # 3..12 typically
 
-    rows = []
-    for k in ks:
-        r = simulate(
-            tasks=tasks,
-            policy_name="static",
-            k_min=k_min,
-            k_max=k_max,
-            static_k=k,
-            delta=delta,
-        )
-        rows.append(
-            {
-                "static_k": k,
-                "vm_hours": r["vm_seconds"] / 3600.0,
-                "sla60": r["sla60_violation"],
-                "sla120": r["sla120_violation"],
-                "p99_wait_s": r["p99_wait_s"],
-            }
-        )
+    rows = run_sweep(
+        tasks,
+        ks,
+        row_fn=lambda k, r: {
+            "static_k": k,
+            "vm_hours": r["vm_seconds"] / 3600.0,
+            "sla60": r["sla60_violation"],
+            "sla120": r["sla120_violation"],
+            "p99_wait_s": r["p99_wait_s"],
+        },
+        cache=ResultCache(),
+        out_path="results/alibaba_static_sweep_fine.json",
+        k_min=k_min,
+        k_max=k_max,
+        delta=delta,
+    )
 
     print(json.dumps(rows, indent=2))
 
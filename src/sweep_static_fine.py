@@ -1,7 +1,9 @@
 import json
 import pickle
 
-from sim_engine import make_workload_from_parquet, simulate
+from sim_engine import make_workload_from_parquet
+from sim_cache import ResultCache
+from sweep_engine import run_sweep
 
 
 def main():
@@ -16,24 +18,21 @@ def main():
 
     ks = list(range(800, 901, 10))
 
-    rows = []
-    for k in ks:
-        r = simulate(
-            tasks=tasks,
-            policy_name="static",
-            k_min=k_min,
-            k_max=k_max,
-            static_k=k,
-            delta=delta,
-        )
-        rows.append(
-            {
-                "static_k": k,
-                "vm_hours": r["vm_seconds"] / 3600.0,
-                "p95_wait_s": r["p95_wait_s"],
-                "sla60": r["sla60_violation"],
-            }
-        )
+    rows = run_sweep(
+        tasks,
+        ks,
+        row_fn=lambda k, r: {
+            "static_k": k,
+            "vm_hours": r["vm_seconds"] / 3600.0,
+            "p95_wait_s": r["p95_wait_s"],
+            "sla60": r["sla60_violation"],
+        },
+        cache=ResultCache(),
+        out_path="results/static_sweep_fine.json",
+        k_min=k_min,
+        k_max=k_max,
+        delta=delta,
+    )
 
     print(json.dumps(rows, indent=2))
 
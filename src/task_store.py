@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import math
+import os
+import shutil
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Clean tasks are stored as a Hive-partitioned Parquet dataset:
+#   <store>/arrival_hour=<h>/<file>.parquet
+# with h = floor(arrival_time_s / 3600). Rows are sorted by arrival_time_s
+# within each file, so row-group min/max statistics on arrival_time_s are
+# tight, and a time-window query reads only the partitions (and row
+# groups) that overlap the window.
+PARTITION_COL = "arrival_hour"
+PARTITION_S = 3600
+ROW_GROUP_SIZE = 128 * 1024
+
+
+def write_task_store(
+    con,
+    query: str,
+    out_dir: str,
+    file_name: str = "part-0.parquet",
+    replace: bool = True,
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> int:
+    """
+    Write the rows of `query` (which must have arrival_time_s) into the
+    partitioned store at `out_dir` and return the number of rows.
+
+    Rows are streamed from DuckDB in arrival order, so memory stays at a
+    few row groups. With `replace` the store is rebuilt in a temporary
+    directory and swapped in; otherwise `file_name` is added to (or
+    replaced in) each touched partition, e.g. one file per ingest batch.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    target = out_dir + ".tmp" if replace else out_dir
+    if replace:
+        _remove(target)
+    os.makedirs(target, exist_ok=True)
+
+    reader = con.execute(
+        f"SELECT * FROM ({query}) AS q ORDER BY arrival_time_s"
+    ).fetch_record_batch(row_group_size)
+
+    n = 0
+    hour = None
+    writer = None
+    pending: List = []
+    pending_rows = 0
+
+    def flush():
+        nonlocal pending, pending_rows
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending), row_group_size=row_group_size)
+        pending, pending_rows = [], 0
+
+    for batch in reader:
+        if batch.num_rows == 0:
+            continue
+        hours = np.floor(batch.column("arrival_time_s").to_numpy() / PARTITION_S).astype(np.int64)
+        cuts = np.flatnonzero(np.diff(hours)) + 1
+        starts = np.concatenate(([0], cuts))
+        ends = np.concatenate((cuts, [len(hours)]))
+        for s, e in zip(starts, ends):
+            h = int(hours[s])
+            if h != hour:
+                if writer is not None:
+                    flush()
+                    writer.close()
+                part_dir = os.path.join(target, f"{PARTITION_COL}={h}")
+                os.makedirs(part_dir, exist_ok=True)
+                writer = pq.ParquetWriter(os.path.join(part_dir, file_name), batch.schema)
+                hour = h
+            pending.append(batch.slice(s, e - s))
+            pending_rows += e - s
+            if pending_rows >= row_group_size:
+                flush()
+        n += batch.num_rows
+    if writer is not None:
+        flush()
+        writer.close()
+
+    if replace:
+        _remove(out_dir)
+        os.replace(target, out_dir)
+    return n
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def store_source(path: str) -> str:
+    """SQL table expression for a task store directory or a single Parquet file."""
+    if os.path.isdir(path):
+        return f"read_parquet('{path}/*/*.parquet', hive_partitioning=true)"
+    return f"read_parquet('{path}')"
+
+
+def window_predicate(path: str, t0: float, t1: float) -> str:
+    """WHERE clause for arrivals in [t0, t1), pruning partitions of a store."""
+    cond = f"arrival_time_s >= {t0} AND arrival_time_s < {t1}"
+    if os.path.isdir(path):
+        h0 = math.floor(t0 / PARTITION_S)
+        h1 = math.floor(t1 / PARTITION_S)
+        cond = f"{PARTITION_COL} BETWEEN {h0} AND {h1} AND " + cond
+    return cond
+
+
+def partitions_predicate(path: str, windows: Sequence[Tuple[float, float]]) -> str:
+    """
+    Partition-only filter for the union of [t0, t1) windows of a store.
+
+    AND it with an OR of `window_predicate`s: DuckDB only prunes hive
+    partitions on a top-level conjunct over the partition column alone.
+    """
+    if not os.path.isdir(path):
+        return "TRUE"
+    hours = sorted(
+        {
+            h
+            for t0, t1 in windows
+            for h in range(math.floor(t0 / PARTITION_S), math.floor(t1 / PARTITION_S) + 1)
+        }
+    )
+    return f"{PARTITION_COL} IN ({', '.join(str(h) for h in hours)})"
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
-from typing import Dict, Tuple
+import argparse
+import json
+import time
+from functools import partial
+from typing import Callable, Dict, Tuple
 import numpy as np
 import pandas as pd
 
+from mdp_policy import compile_policy
+
 
 def make_q_bins(values: np.ndarray, n_bins: int = 10) -> np.ndarray:
     qs = np.quantile(values, np.linspace(0, 1, n_bins + 1))
@@ -87,7 +93,246 @@ def train_mdp_policy(
     return policy, q_bins
 
 
+def train_mdp_policy_batched(
+    arrivals_work: np.ndarray,
+    k_min: int,
+    k_max: int,
+    delta: int = 60,
+    episodes: int = 300,
+    gamma: float = 0.95,
+    alpha: float = 0.15,
+    eps: float = 0.1,
+    w_k: float = 1.0,
+    w_q: float = 1e-4,
+    w_a: float = 0.1,
+    actions: np.ndarray | None = None,
+    horizon: int = 120,
+    batch: int = 64,
+) -> Tuple[Dict[Tuple[int, int], int], np.ndarray]:
+    """
+    Same aggregated MDP and Q-learning as `train_mdp_policy`, but
+    `batch` independent episodes advance in lockstep as arrays:
+    epsilon-greedy selection, transitions and rewards are vectorized, and
+    the TD errors of a step that land on the same (k, q_bin, action) cell
+    are averaged, so each cell takes at most one alpha-sized step per tick
+    however many episodes visit it.
+    Exploration draws, random actions and arrival samples are pre-drawn
+    per block of episodes.
+    """
+    rng = np.random.default_rng(7)
+    q_bins = make_q_bins(arrivals_work, n_bins=12)
+    n_q = len(q_bins) - 1
+    if actions is None:
+        actions = np.array([-100, -50, 0, 50, 100], dtype=int)
+    n_a = len(actions)
+
+    Q = np.zeros((k_max + 1, n_q, n_a), dtype=float)
+
+    def qbin(x: np.ndarray) -> np.ndarray:
+        # np.digitize(x, q_bins) - 1, clipped to a valid bin
+        idx = np.searchsorted(q_bins, x, side="right") - 1
+        return np.clip(idx, 0, n_q - 1)
+
+    done = 0
+    while done < episodes:
+        b = min(batch, episodes - done)
+        explore = rng.random((horizon, b)) < eps
+        rand_ai = rng.integers(0, n_a, size=(horizon, b))
+        w_in = arrivals_work[rng.integers(0, len(arrivals_work), size=(horizon, b))]
+
+        k = rng.integers(k_min, k_max + 1, size=b)
+        q = np.zeros(b, dtype=float)
+        qb = qbin(q)
+        for t in range(horizon):
+            ai = np.where(explore[t], rand_ai[t], np.argmax(Q[k, qb], axis=1))
+
+            a = actions[ai]
+            k2 = np.clip(k + a, k_min, k_max)
+            q2 = np.maximum(0.0, q + w_in[t] - k2 * delta)
+
+            r = -(w_k * k2 + w_q * q2 + w_a * np.abs(a))
+
+            qb2 = qbin(q2)
+            td = r + gamma * Q[k2, qb2].max(axis=1) - Q[k, qb, ai]
+            cells, slot, hits = np.unique(
+                np.ravel_multi_index((k, qb, ai), Q.shape),
+                return_inverse=True,
+                return_counts=True,
+            )
+            Q.flat[cells] += alpha * np.bincount(slot, weights=td) / hits
+
+            k, q, qb = k2, q2, qb2
+        done += b
+
+    policy: Dict[Tuple[int, int], int] = {}
+    for k in range(k_min, k_max + 1):
+        for qb in range(n_q):
+            best = int(actions[int(np.argmax(Q[k, qb]))])
+            policy[(k, qb)] = best
+
+    return policy, q_bins
+
+
+def solve_mdp_policy(
+    arrivals_work: np.ndarray,
+    k_min: int,
+    k_max: int,
+    delta: int = 60,
+    gamma: float = 0.95,
+    w_k: float = 1.0,
+    w_q: float = 1e-4,
+    w_a: float = 0.1,
+    actions: np.ndarray | None = None,
+    n_sub: int = 8,
+    tol: float = 1e-6,
+    max_iter: int = 10_000,
+) -> Tuple[Dict[Tuple[int, int], int], np.ndarray]:
+    """
+    Solve the aggregated MDP of `train_mdp_policy` exactly by value iteration.
+
+    The model is known: q' = max(0, q + w_in - k' * delta) with w_in i.i.d.
+    from the empirical `arrivals_work`. Each q bin is represented by
+    `n_sub` evenly spaced backlog values; averaging over them and over
+    w_in gives the bin transition matrix T[k', qb, qb'] and the expected
+    next backlog E[q' | k', qb]. Returns the same (policy, q_bins) as the
+    Q-learning trainers.
+    """
+    q_bins = make_q_bins(arrivals_work, n_bins=12)
+    n_q = len(q_bins) - 1
+    if actions is None:
+        actions = np.array([-100, -50, 0, 50, 100], dtype=int)
+
+    w_vals, w_counts = np.unique(np.asarray(arrivals_work, dtype=float), return_counts=True)
+    w_prob = w_counts / w_counts.sum()
+
+    # representative backlog values inside each bin: (n_q, n_sub)
+    frac = (np.arange(n_sub) + 0.5) / n_sub
+    q_rep = q_bins[:-1, None] + frac[None, :] * np.diff(q_bins)[:, None]
+
+    ks = np.arange(k_min, k_max + 1)
+    n_k = len(ks)
+    T = np.zeros((n_k, n_q, n_q), dtype=float)
+    EQ = np.zeros((n_k, n_q), dtype=float)
+    for ki, k2 in enumerate(ks):
+        q2 = np.maximum(0.0, q_rep[:, :, None] + w_vals[None, None, :] - k2 * delta)
+        qb2 = np.clip(np.searchsorted(q_bins, q2, side="right") - 1, 0, n_q - 1)
+        p = np.broadcast_to(w_prob / n_sub, q2.shape)
+        cell = np.arange(n_q)[:, None, None] * n_q + qb2  # flat (qb, qb') index
+        T[ki] = np.bincount(cell.ravel(), weights=p.ravel(), minlength=n_q * n_q).reshape(n_q, n_q)
+        EQ[ki] = (q2 * p).sum(axis=(1, 2))
+
+    # next-k index per (k, action) and the immediate reward per (k', qb, action)
+    k2_idx = np.clip(ks[:, None] + actions[None, :], k_min, k_max) - k_min  # (n_k, n_a)
+    R = -(
+        w_k * ks[k2_idx][:, None, :]
+        + w_q * EQ[k2_idx].transpose(0, 2, 1)
+        + w_a * np.abs(actions)[None, None, :]
+    )  # (n_k, n_q, n_a)
+
+    V = np.zeros((n_k, n_q), dtype=float)
+    for _ in range(max_iter):
+        EV = np.einsum("kij,kj->ki", T, V)  # E[V(k', qb') | k', qb]
+        Qsa = R + gamma * EV[k2_idx].transpose(0, 2, 1)
+        V_new = Qsa.max(axis=2)
+        diff = float(np.max(np.abs(V_new - V)))
+        V = V_new
+        if diff < tol:
+            break
+
+    best = np.argmax(Qsa, axis=2)
+    policy: Dict[Tuple[int, int], int] = {}
+    for ki, k in enumerate(ks):
+        for qb in range(n_q):
+            policy[(int(k), qb)] = int(actions[best[ki, qb]])
+
+    return policy, q_bins
+
+
+def evaluate_policy(
+    policy: Dict[Tuple[int, int], int],
+    q_bins: np.ndarray,
+    arrivals_work: np.ndarray,
+    k_min: int,
+    k_max: int,
+    delta: int = 60,
+    w_k: float = 1.0,
+    w_q: float = 1e-4,
+    w_a: float = 0.1,
+    episodes: int = 200,
+    horizon: int = 120,
+    seed: int = 3,
+) -> float:
+    """
+    Mean undiscounted episode reward of a greedy policy on the aggregated
+    MDP the trainers use (random start k, empty backlog, `horizon` steps).
+    Every policy sees the same start states and arrival draws.
+    """
+    rng = np.random.default_rng(seed)
+    n_q = len(q_bins) - 1
+    table = np.zeros((k_max + 1, n_q), dtype=int)
+    for (k, qb), a in policy.items():
+        table[k, qb] = a
+
+    k = rng.integers(k_min, k_max + 1, size=episodes)
+    q = np.zeros(episodes, dtype=float)
+    w_in = arrivals_work[rng.integers(0, len(arrivals_work), size=(horizon, episodes))]
+    total = np.zeros(episodes, dtype=float)
+    for t in range(horizon):
+        qb = np.clip(np.searchsorted(q_bins, q, side="right") - 1, 0, n_q - 1)
+        a = table[k, qb]
+        k = np.clip(k + a, k_min, k_max)
+        q = np.maximum(0.0, q + w_in[t] - k * delta)
+        total -= w_k * k + w_q * q + w_a * np.abs(a)
+    return float(total.mean())
+
+
+def run_solvers(
+    solvers: Dict[str, Callable[[], Tuple[Dict[Tuple[int, int], int], np.ndarray]]],
+    solver: str,
+    compare: bool,
+    eval_kwargs: Dict,
+    eval_path: str,
+) -> Tuple[Dict[Tuple[int, int], int], np.ndarray]:
+    """
+    Run `solver` and return its (policy, q_bins). With `compare`, run every
+    solver too and write each one's `evaluate_policy` score and wall time
+    to `eval_path`.
+    """
+    if not compare:
+        return solvers[solver]()
+
+    results = {}
+    rows = {}
+    for name, fn in solvers.items():
+        t0 = time.perf_counter()
+        results[name] = fn()
+        wall = time.perf_counter() - t0
+        rows[name] = {
+            "mean_episode_reward": evaluate_policy(*results[name], **eval_kwargs),
+            "wall_s": wall,
+        }
+        print(f"{name}: mean episode reward {rows[name]['mean_episode_reward']:.1f}, {wall:.1f}s")
+    with open(eval_path, "w") as f:
+        json.dump(rows, f, indent=2)
+    print("Wrote", eval_path)
+    return results[solver]
+
+
 def main():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--solver",
+        choices=["qlearn", "qlearn_batched", "vi"],
+        default="qlearn",
+        help="Q-learning (sequential or batched) or exact value iteration on the aggregated MDP",
+    )
+    p.add_argument(
+        "--compare",
+        action="store_true",
+        help="also run the other solvers and write their scores to results/mdp_solver_eval.json",
+    )
+    args = p.parse_args()
+
     inp = "data/processed/google_tasks_2h.parquet"
     df = pd.read_parquet(inp).sort_values("arrival_time_s").reset_index(drop=True)
 
@@ -114,15 +359,17 @@ def main():
 
     print("Estimated k_min,k_max:", k_min, k_max)
 
-    policy, q_bins = train_mdp_policy(
-        arrivals_work=arrivals_work,
-        k_min=k_min,
-        k_max=k_max,
-        delta=delta,
-        episodes=600,
-        w_k=0.5,
-        w_q=1e-2,
-        w_a=1.0,
+    model = dict(arrivals_work=arrivals_work, k_min=k_min, k_max=k_max, delta=delta, w_k=0.5, w_q=1e-2, w_a=1.0)
+    policy, q_bins = run_solvers(
+        {
+            "qlearn": partial(train_mdp_policy, episodes=600, **model),
+            "qlearn_batched": partial(train_mdp_policy_batched, episodes=600, **model),
+            "vi": partial(solve_mdp_policy, **model),
+        },
+        args.solver,
+        args.compare,
+        model,
+        "results/mdp_solver_eval.json",
     )
 
     np.save("results/mdp_q_bins.npy", q_bins)
@@ -133,7 +380,12 @@ def main():
             {"policy": policy, "k_min": k_min, "k_max": k_max, "delta": delta}, f
         )
 
-    print("Wrote results/mdp_policy.pkl and results/mdp_q_bins.npy")
+    compile_policy(policy, q_bins, k_min, k_max, delta).save("results/mdp_policy.npz")
+
+    print(
+        "Wrote results/mdp_policy.pkl, results/mdp_q_bins.npy"
+        " and results/mdp_policy.npz"
+    )
 
 
 if __name__ == "__main__":
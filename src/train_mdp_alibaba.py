@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import argparse
+from functools import partial
 from typing import Dict, Tuple
 import numpy as np
 import pandas as pd
 
+from mdp_policy import compile_policy
+from train_mdp import run_solvers, solve_mdp_policy, train_mdp_policy_batched
+
 
 def make_q_bins(values: np.ndarray, n_bins: int = 10) -> np.ndarray:
     qs = np.quantile(values, np.linspace(0, 1, n_bins + 1))
@@ -88,6 +93,20 @@ def train_mdp_policy(
 
 
 def main():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--solver",
+        choices=["qlearn", "qlearn_batched", "vi"],
+        default="qlearn",
+        help="Q-learning (sequential or batched) or exact value iteration on the aggregated MDP",
+    )
+    p.add_argument(
+        "--compare",
+        action="store_true",
+        help="also run the other solvers and write their scores to results/alibaba_mdp_solver_eval.json",
+    )
+    args = p.parse_args()
+
     inp = "data/processed/alibaba/alibaba_tasks_24h.parquet"
     df = pd.read_parquet(inp).sort_values("arrival_time_s").reset_index(drop=True)
 
@@ -114,15 +133,20 @@ def main():
 
     print("Estimated k_min,k_max:", k_min, k_max)
 
-    policy, q_bins = train_mdp_policy(
-        arrivals_work=arrivals_work,
-        k_min=k_min,
-        k_max=k_max,
-        delta=delta,
-        episodes=1500,
-        w_k=2.0,
-        w_q=1e-2,
-        w_a=2.0,
+    model = dict(arrivals_work=arrivals_work, k_min=k_min, k_max=k_max, delta=delta, w_k=2.0, w_q=1e-2, w_a=2.0)
+    actions = np.array([-20, -10, 0, 10, 20], dtype=int)
+    policy, q_bins = run_solvers(
+        {
+            "qlearn": partial(train_mdp_policy, episodes=1500, **model),
+            "qlearn_batched": partial(
+                train_mdp_policy_batched, episodes=1500, actions=actions, horizon=1440, **model
+            ),
+            "vi": partial(solve_mdp_policy, actions=actions, **model),
+        },
+        args.solver,
+        args.compare,
+        dict(model, horizon=1440),
+        "results/alibaba_mdp_solver_eval.json",
     )
 
     np.save("results/alibaba_mdp_q_bins.npy", q_bins)
@@ -133,7 +157,12 @@ def main():
             {"policy": policy, "k_min": k_min, "k_max": k_max, "delta": delta}, f
         )
 
-    print("Wrote results/alibaba_mdp_policy.pkl and results/alibaba_mdp_q_bins.npy")
+    compile_policy(policy, q_bins, k_min, k_max, delta).save("results/alibaba_mdp_policy.npz")
+
+    print(
+        "Wrote results/alibaba_mdp_policy.pkl, results/alibaba_mdp_q_bins.npy"
+        " and results/alibaba_mdp_policy.npz"
+    )
 
 
 if __name__ == "__main__":
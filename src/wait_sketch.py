@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import math
+from typing import List
+
+import numpy as np
+
+
+class WaitSketch:
+    """
+    Fixed-size, mergeable summary of task waiting times.
+
+    Waits are counted in log-spaced buckets (relative accuracy `rel_err`,
+    DDSketch-style) between `min_wait` and `max_wait`; anything below
+    `min_wait` (including the many zero waits) goes in bucket 0 and
+    anything above `max_wait` in the last bucket. The count, the sum and
+    the SLA60/SLA120 violation counts are kept exactly, so mean wait and
+    SLA rates match the exact computation; quantiles (interpolated like
+    np.quantile) are within `rel_err`, or `min_wait` for smaller waits.
+    Memory does not depend on the number of waits recorded.
+    """
+
+    def __init__(
+        self,
+        rel_err: float = 0.01,
+        min_wait: float = 1e-3,
+        max_wait: float = 1e7,
+        buffer_size: int = 4096,
+    ) -> None:
+        self.rel_err = rel_err
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self._gamma = (1.0 + rel_err) / (1.0 - rel_err)
+        self._log_gamma = math.log(self._gamma)
+        self._offset = math.ceil(math.log(min_wait) / self._log_gamma) - 1
+        n_log = math.ceil(math.log(max_wait) / self._log_gamma) - self._offset
+        self.counts = np.zeros(n_log + 1, dtype=np.int64)
+        self.n = 0
+        self.total = 0.0
+        self.over_60 = 0
+        self.over_120 = 0
+        self._buf: List[float] = []
+        self._buffer_size = buffer_size
+
+    def add(self, w: float) -> None:
+        self.n += 1
+        self.total += w
+        if w > 60.0:
+            self.over_60 += 1
+            if w > 120.0:
+                self.over_120 += 1
+        self._buf.append(w)
+        if len(self._buf) >= self._buffer_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buf:
+            return
+        w = np.asarray(self._buf, dtype=float)
+        self._buf.clear()
+        idx = np.zeros(len(w), dtype=np.int64)
+        pos = w >= self.min_wait
+        idx[pos] = np.ceil(np.log(w[pos]) / self._log_gamma).astype(np.int64) - self._offset
+        np.clip(idx, 0, len(self.counts) - 1, out=idx)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def _value(self, b: int) -> float:
+        if b == 0:
+            return 0.0
+        # midpoint (in relative terms) of (gamma^(i-1), gamma^i]
+        i = b + self._offset
+        return 2.0 * self._gamma**i / (self._gamma + 1.0)
+
+    def quantile(self, q: float) -> float:
+        self._flush()
+        if self.n == 0:
+            return 0.0
+        # np.quantile's default: interpolate linearly between the values of
+        # ranks floor(rank) and ceil(rank); both are within rel_err, so is
+        # their convex combination (waits under min_wait count as 0)
+        rank = q * (self.n - 1)
+        lo = math.floor(rank)
+        cum = np.cumsum(self.counts)
+        b_lo, b_hi = np.searchsorted(cum, [lo, min(lo + 1, self.n - 1)], side="right")
+        last = len(self.counts) - 1
+        v_lo = self._value(min(int(b_lo), last))
+        v_hi = self._value(min(int(b_hi), last))
+        return v_lo + (rank - lo) * (v_hi - v_lo)
+
+    def mean(self) -> float:
+        return self.total / self.n if self.n else 0.0
+
+    def sla(self, threshold_s: float) -> float:
+        if threshold_s == 60.0:
+            bad = self.over_60
+        elif threshold_s == 120.0:
+            bad = self.over_120
+        else:
+            raise ValueError("Only 60s and 120s SLA counters are tracked.")
+        return bad / self.n if self.n else 0.0
+
+    def merge(self, other: "WaitSketch") -> "WaitSketch":
+        """Fold `other` into this sketch (same bucket layout required)."""
+        if (self.rel_err, self.min_wait, self.max_wait) != (
+            other.rel_err,
+            other.min_wait,
+            other.max_wait,
+        ):
+            raise ValueError("Cannot merge sketches with different bucket layouts.")
+        self._flush()
+        other._flush()
+        self.counts += other.counts
+        self.n += other.n
+        self.total += other.total
+        self.over_60 += other.over_60
+        self.over_120 += other.over_120
+        return self
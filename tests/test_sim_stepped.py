@@ -0,0 +1,18 @@
+from sim_engine import Task, simulate
+from sim_stepped import simulate_stepped
+
+
+def test_idle_cluster_starts_task_larger_than_pooled_capacity():
+    # 0.99 cpu exceeds k * eff_cpu for k=1 (eff_cpu = 1 - 0.5 * mean cpu)
+    tasks = [Task(0.0, 100.0, 0.99, 0.5), Task(1.0, 10.0, 0.99, 0.99), Task(2.0, 5.0, 0.1, 0.1)]
+    exact = simulate(tasks, "static", 1, 1, static_k=1)
+    approx = simulate_stepped(tasks, "static", 1, 1, static_k=1)
+    assert approx["tasks_started"] == 3
+    assert approx["mean_wait_s"] == exact["mean_wait_s"]
+
+
+def test_single_whole_vm_task():
+    tasks = [Task(0.0, 30.0, 0.99, 0.2)]
+    approx = simulate_stepped(tasks, "static", 1, 1, static_k=1)
+    assert approx["mean_wait_s"] == 0.0
+    assert approx["vm_seconds"] > 0.0